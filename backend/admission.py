@@ -0,0 +1,200 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+from .metrics import registry, Counter, GaugeCollector, Histogram
+from .red_flags import red_flag_detector
+from .vitals import score_vitals
+
+HIGH = "high"
+NORMAL = "normal"
+
+admission_wait = registry.register(Histogram(
+    "admission_wait_seconds", "Time requests spent queued for an analysis slot, by lane.", ("lane",)
+))
+admission_outcomes = registry.register(Counter(
+    "admission_requests_total", "Admission decisions by lane and outcome (admitted, shed, timeout).", ("lane", "outcome")
+))
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is shed; the API answers 503 with Retry-After.
+    """
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"Server is at capacity ({lane} lane); retry in {retry_after}s.")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class Lane:
+    def __init__(self, name: str, queue_limit: int, max_wait: float):
+        self.name = name
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.active = 0
+
+
+class AdmissionController:
+    """
+    Priority admission for the analysis endpoints.
+
+    A cheap pre-screen (the negation-aware red-flag check of the raw text and the
+    NEWS2 score of the vitals) sorts requests into a high-priority lane for
+    suspected emergencies and a normal lane for everything else, before any
+    LLM or retrieval work starts. At most
+    `capacity` analyses run at once and the last `reserved` slots are only
+    handed to the high lane, so an emergency never waits behind routine cases.
+    Freed slots go to queued high-lane requests first. Each lane's queue is
+    bounded in length and wait time; beyond that requests are shed with a
+    Retry-After estimated from recent service times.
+    """
+
+    def __init__(self):
+        self.capacity = int(os.getenv("ADMISSION_CONCURRENCY", "32"))
+        self.reserved = min(int(os.getenv("ADMISSION_RESERVED_SLOTS", "4")), max(self.capacity - 1, 0))
+        self.lanes: Dict[str, Lane] = {
+            HIGH: Lane(
+                HIGH,
+                int(os.getenv("ADMISSION_HIGH_QUEUE_LIMIT", "256")),
+                float(os.getenv("ADMISSION_HIGH_MAX_WAIT", "30"))
+            ),
+            NORMAL: Lane(
+                NORMAL,
+                int(os.getenv("ADMISSION_QUEUE_LIMIT", "64")),
+                float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+            ),
+        }
+        self.active = 0
+        # Moving average of how long an admitted request holds its slot
+        self.service_time = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def classify(self, text: str, vitals: Dict[str, Any] = None) -> str:
+        """
+        Pre-screen on the raw text and vitals: suspected emergencies go to the high lane.
+        """
+        if red_flag_detector.match_text(text) or score_vitals(vitals).critical:
+            return HIGH
+        return NORMAL
+
+    def _limit(self, lane: str) -> int:
+        return self.capacity if lane == HIGH else self.capacity - self.reserved
+
+    def _start(self, lane: Lane):
+        self.active += 1
+        lane.active += 1
+
+    def _dispatch(self):
+        # Strict priority: the normal lane only gets slots no emergency is waiting for
+        for name in (HIGH, NORMAL):
+            lane = self.lanes[name]
+            while lane.waiters and self.active < self._limit(name):
+                waiter = lane.waiters.popleft()
+                if not waiter.done():
+                    self._start(lane)
+                    waiter.set_result(None)
+
+    def retry_after(self, lane: str) -> int:
+        queued = sum(len(l.waiters) for l in self.lanes.values())
+        return max(1, math.ceil((queued + 1) * self.service_time / max(self._limit(lane), 1)))
+
+    def _shed(self, lane: Lane, outcome: str) -> Overloaded:
+        admission_outcomes.inc(lane.name, outcome)
+        return Overloaded(lane.name, self.retry_after(lane.name))
+
+    async def acquire(self, lane_name: str):
+        """
+        Waits for a slot in the given lane, or raises Overloaded.
+        """
+        lane = self.lanes[lane_name]
+        started = time.perf_counter()
+        if not lane.waiters and self.active < self._limit(lane_name):
+            self._start(lane)
+        else:
+            if len(lane.waiters) >= lane.queue_limit:
+                raise self._shed(lane, "shed")
+            waiter = asyncio.get_running_loop().create_future()
+            lane.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), lane.max_wait)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was granted just as the wait ended; hand it back
+                    self.release(lane_name)
+                else:
+                    waiter.cancel()
+                    try:
+                        lane.waiters.remove(waiter)
+                    except ValueError:
+                        pass
+                if isinstance(exc, asyncio.CancelledError):
+                    raise
+                raise self._shed(lane, "timeout")
+        admission_wait.observe(time.perf_counter() - started, lane_name)
+        admission_outcomes.inc(lane_name, "admitted")
+
+    def release(self, lane_name: str, held: Optional[float] = None):
+        self.active -= 1
+        self.lanes[lane_name].active -= 1
+        if held is not None:
+            self.service_time = 0.9 * self.service_time + 0.1 * held
+        self._dispatch()
+
+    async def enter(self, lane: str) -> Callable[[], None]:
+        """
+        Takes a slot in `lane` and returns an idempotent release function, for
+        work that outlives the handler (e.g. a streamed response).
+        """
+        if not self.enabled:
+            return lambda: None
+        await self.acquire(lane)
+        started = time.perf_counter()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.release(lane, time.perf_counter() - started)
+
+        return release
+
+    @asynccontextmanager
+    async def admit(self, lane: str):
+        """
+        Holds an analysis slot in `lane` for the duration of the block.
+        """
+        release = await self.enter(lane)
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                "queued": len(lane.waiters),
+                "active": lane.active,
+                "slots": self._limit(name),
+                "queue_limit": lane.queue_limit,
+            }
+            for name, lane in self.lanes.items()
+        }
+
+
+# Singleton instance
+admission = AdmissionController()
+registry.register(GaugeCollector(
+    "admission_lane", "Queued and running analyses per admission lane.", ("lane", "stat"),
+    lambda: {(lane, stat): value for lane, stats in admission.stats().items() for stat, value in stats.items()}
+))
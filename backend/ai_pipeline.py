@@ -1,5 +1,26 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncContextManager, AsyncIterator, Callable, Mapping, Tuple
+
+from .cache import PersistentCache, SingleFlight, MISSING
+from .knowledge_base import knowledge_base
+from .llm_client import llm_client, LLMUnavailable
+from .local_extractor import local_extractor, ontology
+from .medication_checker import medication_safety  # registers the interaction source
+from .metrics import stage_timer, record_triage, register_cache, extraction_paths
+from .red_flags import red_flag_detector
+from .snapshots import snapshots
+from .triage_rules import triage_rules
+from .vitals import VitalsScore, score_vitals, encode_vitals_batch, score_vitals_batch, vitals_scores_from_batch
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the extraction prompt changes so cached extractions are not reused
+EXTRACTION_PROMPT_VERSION = "v2"
 
 class SymptomIntelligenceEngine:
     """
@@ -9,11 +30,71 @@ class SymptomIntelligenceEngine:
     def __init__(self):
         # Placeholder for LLM and Vector DB initialization
         self.knowledge_base_ready = False
-        self.model_name = "gpt-4-turbo"
+        self.model_name = os.getenv("LLM_MODEL", "gpt-4-turbo")
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.is_fully_configured = bool(self.api_key and self.api_key.startswith("sk-"))
 
+        # Extraction cache: survives restarts; identical in-flight requests share one LLM call
+        self.extraction_cache = PersistentCache(
+            path=os.getenv("EXTRACTION_CACHE_PATH", "./cache/extractions.db"),
+            max_entries=int(os.getenv("EXTRACTION_CACHE_SIZE", "50000")),
+            max_age=float(os.getenv("EXTRACTION_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+        )
+        self._extraction_flight = SingleFlight()
+        register_cache("extraction", self.extraction_cache.stats)
+
+        # Local extractions at or above this confidence skip the LLM entirely
+        self.local_confidence_threshold = float(os.getenv("LOCAL_EXTRACTION_MIN_CONFIDENCE", "0.8"))
+
+    def extraction_cache_key(self, text: str) -> str:
+        """
+        Hash of the normalized text, model name and prompt version.
+        """
+        normalized = " ".join(text.split()).lower()
+        return hashlib.sha256(f"{self.model_name}\0{EXTRACTION_PROMPT_VERSION}\0{normalized}".encode("utf-8")).hexdigest()
+
     async def extract_symptoms(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Extracts structured symptoms. The local ontology extractor runs first and
+        its result is used as-is when it accounts for the whole input. Texts with
+        a word it does not know or a red flag (which may name something the
+        ontology lacks, e.g. "unconscious") go to the LLM, served from the persistent cache when
+        the same text was seen before. Concurrent identical requests share one
+        upstream call. If the LLM is unavailable the local result is used; such
+        fallback results are not cached so the LLM is used again once it recovers.
+        """
+        with stage_timer("extract_symptoms"):
+            with stage_timer("local_extraction"):
+                local = local_extractor.scan(text)
+            local_symptoms = local.symptoms
+            if (
+                local.confidence >= self.local_confidence_threshold
+                and not local.unrecognized
+                and not self.match_text_red_flags(text)
+            ):
+                extraction_paths.inc("local")
+                return local_symptoms
+
+            key = self.extraction_cache_key(text)
+            cached = await self.extraction_cache.get_async(key)
+            if cached is not MISSING:
+                extraction_paths.inc("cache")
+                return cached
+
+            async def extract():
+                try:
+                    symptoms = await self._extract_with_llm(text)
+                except (LLMUnavailable, ValueError, KeyError) as exc:
+                    logger.info("LLM extraction unavailable, using local extractor: %s", exc)
+                    extraction_paths.inc("fallback")
+                    return local_symptoms
+                extraction_paths.inc("llm")
+                await self.extraction_cache.set_async(key, symptoms)
+                return symptoms
+
+            return await self._extraction_flight.run(key, extract)
+
+    async def _extract_with_llm(self, text: str) -> List[Dict[str, Any]]:
         """
         Uses LLM to extract structured symptom list from unstructured user text.
         """
@@ -30,79 +111,179 @@ class SymptomIntelligenceEngine:
         [{{"name": "...", "severity": "...", "duration": "..."}}]
         """
         
-        # In a real implementation, we would call the OpenAI API:
-        # response = await openai.ChatCompletion.acreate(
-        #     model=self.model_name,
-        #     messages=[{"role": "user", "content": prompt}]
-        # )
-        # return json.loads(response.choices[0].message.content)
-        
-        # Mocking the AI response for now to allow integration development
+        with stage_timer("llm_extraction"):
+            content = await llm_client.chat_completion(
+                self.model_name,
+                [{"role": "user", "content": prompt}],
+                temperature=0
+            )
+        # Models sometimes wrap JSON in a markdown fence
+        content = content.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+        symptoms = json.loads(content)
+        if not isinstance(symptoms, list):
+            raise ValueError("LLM extraction did not return a JSON list.")
+        for s in symptoms:
+            if (
+                not isinstance(s, dict)
+                or not isinstance(s.get("name"), str)
+                or not isinstance(s.get("severity"), (str, type(None)))
+                or not isinstance(s.get("duration"), (str, type(None)))
+            ):
+                raise ValueError(f"LLM extraction returned a malformed symptom: {s!r}")
+        # Map the model's wording onto the ontology's canonical names used downstream
         return [
-            {"name": "Abdominal Pain", "severity": "moderate", "duration": "2 hours"},
-            {"name": "Nausea", "severity": "mild", "duration": "recent"}
+            {"name": ontology.canonical_symptom(s["name"]), "severity": s.get("severity") or "unknown", "duration": s.get("duration")}
+            for s in symptoms if s["name"].strip()
         ]
 
+    def assess_vitals(self, vitals: Dict[str, Any] = None) -> VitalsScore:
+        """
+        NEWS2 early-warning score of the vital signs (see vitals.py); microseconds, no I/O.
+        """
+        with stage_timer("vitals"):
+            return score_vitals(vitals)
+
+    async def analyze(
+        self,
+        text: str,
+        vitals: Dict[str, Any] = None,
+        medications: List[str] = None,
+        existing_conditions: List[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Full analysis of one request. Vitals are scored first: a critical NEWS2
+        is a clear physiological emergency, so the case is triaged on the local
+        extractor alone and neither the LLM nor protocol retrieval is awaited.
+        """
+        vitals_score = self.assess_vitals(vitals)
+        if vitals_score.critical:
+            extraction_paths.inc("local")
+            symptoms = local_extractor.extract(text)
+        else:
+            symptoms = await self.extract_symptoms(text)
+        return await self.generate_diagnosis_and_triage(
+            symptoms, vitals, medications, existing_conditions, vitals_score=vitals_score,
+            text_red_flags=self.match_text_red_flags(text)
+        )
 
     async def detect_red_flags(self, symptoms: List[str]) -> bool:
         """
         Quick check for emergency symptoms that require immediate triage.
         """
-        emergency_keywords = ["chest pain", "shortness of breath", "unconscious"]
-        return any(keyword in " ".join(symptoms).lower() for keyword in emergency_keywords)
+        return bool(await self.match_red_flags(symptoms))
 
-    async def retrieve_clinical_guidelines(self, symptoms: List[str]) -> List[Dict[str, Any]]:
+    async def match_red_flags(self, symptoms: List[str]) -> List[str]:
+        """
+        Returns the emergency red-flag phrases found in the symptoms, for citing in the reasoning.
+        """
+        with stage_timer("red_flags"):
+            return red_flag_detector.match(symptoms)
+
+    def match_text_red_flags(self, text: str) -> List[str]:
+        """
+        Red-flag phrases in the raw request text, negation-aware (see RedFlagDetector.match_text).
+        """
+        with stage_timer("red_flags"):
+            return red_flag_detector.match_text(text)
+
+    def _merge_red_flags(self, text: str, symptom_red_flags: List[str]) -> List[str]:
+        return list(dict.fromkeys(self.match_text_red_flags(text) + symptom_red_flags))
+
+    async def retrieve_clinical_guidelines(self, symptoms: List[str], view: Mapping[str, Any] = None) -> List[Dict[str, Any]]:
         """
         RAG: Retrieve relevant WHO/Clinical protocols from the Knowledge Base.
         """
-        from .knowledge_base import knowledge_base
-        return await knowledge_base.retrieve(symptoms)
+        with stage_timer("retrieval"):
+            return await knowledge_base.retrieve(symptoms, view)
+
+    async def pin_snapshots(self) -> Mapping[str, Any]:
+        """
+        Pins one generation of the hot-reloadable protocol and interaction data,
+        so a request finishes on the version it started with even if a reload
+        lands meanwhile (see snapshots.py).
+        """
+        if not knowledge_base.connected:
+            # First use loads the indexes; keep that off the event loop
+            await asyncio.get_running_loop().run_in_executor(knowledge_base.executor, knowledge_base.connect)
+        return await snapshots.view_async(knowledge_base.executor)
 
     async def generate_diagnosis_and_triage(
         self, 
         extracted_symptoms: List[Dict[str, Any]], 
         vitals: Dict[str, Any] = None,
         medications: List[str] = None,
-        existing_conditions: List[str] = None
+        existing_conditions: List[str] = None,
+        vitals_score: VitalsScore = None,
+        text_red_flags: List[str] = None
     ) -> Dict[str, Any]:
         """
         Final reasoning step to provide a structured triage output.
+        With critical vitals, protocol retrieval is skipped: the level is already
+        EMERGENCY and the cheap safety checks are all that is worth waiting for.
+        `text_red_flags` are red flags already found in the raw text; they are
+        merged with those of the extracted symptoms, as the stream does.
         """
-        from .medication_checker import medication_safety
-        
         symptom_names = [s["name"] for s in extracted_symptoms]
-        is_emergency = await self.detect_red_flags(symptom_names)
+        if vitals_score is None:
+            vitals_score = self.assess_vitals(vitals)
         
-        # 1. RAG retrieval from medical knowledge base
-        retrieved_protocols = await self.retrieve_clinical_guidelines(symptom_names)
+        # Red flags, 1. RAG retrieval and 2. Medication/Condition safety checks are independent
+        with stage_timer("generate_diagnosis_and_triage"):
+            view = await self.pin_snapshots()
+            red_flags, retrieved_protocols, safety_alerts = await asyncio.gather(
+                self.match_red_flags(symptom_names),
+                self._no_protocols() if vitals_score.critical else self.retrieve_clinical_guidelines(symptom_names, view),
+                medication_safety.check_interactions(medications or [], existing_conditions or [], view)
+            )
+            red_flags = list(dict.fromkeys((text_red_flags or []) + red_flags))
+            return self.build_triage(
+                extracted_symptoms, red_flags, retrieved_protocols, safety_alerts,
+                snapshot_version=snapshots.version(view), vitals_score=vitals_score
+            )
+
+    @staticmethod
+    async def _no_protocols() -> List[Dict[str, Any]]:
+        return []
+
+    def build_triage(
+        self,
+        extracted_symptoms: List[Dict[str, Any]],
+        red_flags: List[str],
+        retrieved_protocols: List[Dict[str, Any]],
+        safety_alerts: List[Dict[str, Any]],
+        triage_level: str = None,
+        snapshot_version: str = None,
+        vitals_score: VitalsScore = None
+    ) -> Dict[str, Any]:
+        """
+        Pure decision step: merges red flags, protocols, safety alerts and the
+        NEWS2 vitals score into the triage output.
+        The level comes from the declarative rule table unless a batch caller already evaluated it.
+        `snapshot_version` names the data generation the inputs were computed from, for audits.
+        """
         protocol_summaries = [f"{p['source']}: {p['condition']}" for p in retrieved_protocols]
-        
-        # 2. Medication/Condition safety checks
-        safety_alerts = await medication_safety.check_interactions(medications or [], existing_conditions or [])
-        
-        # 3. Decision Logic
-        triage_level = "EMERGENCY" if is_emergency else "ROUTINE"
-        severities = [s.get("severity", "").lower() for s in extracted_symptoms]
-        
-        if "severe" in severities and not is_emergency:
-            triage_level = "URGENT"
-        elif "moderate" in severities and triage_level == "ROUTINE":
-            triage_level = "URGENT"
+        is_emergency = bool(red_flags)
+        red_flag_summary = f"Positive ({', '.join(red_flags)})" if is_emergency else "Negative"
 
-        
-        # Escalate if safety alerts are critical
-        if any(a["severity"] in ["HIGH", "CRITICAL"] for a in safety_alerts):
-            triage_level = "URGENT" if triage_level == "ROUTINE" else triage_level
+        # 3. Decision Logic (see data/triage_rules.json)
+        if triage_level is None:
+            triage_level = triage_rules.evaluate(
+                triage_rules.features(extracted_symptoms, red_flags, safety_alerts, vitals_score)
+            )
 
         reasoning = (
             f"Assessment based on {len(extracted_symptoms)} symptoms identified. "
             f"Clinical protocols matched: {', '.join(protocol_summaries) if protocol_summaries else 'General assessment'}. "
             f"Safety alerts found: {len(safety_alerts)}. "
-            f"Red flag check: {'Positive' if is_emergency else 'Negative'}."
+            f"Red flag check: {red_flag_summary}."
         )
+        if vitals_score is not None and vitals_score.parameters:
+            reasoning += f" NEWS2 vitals score: {vitals_score.total} ({vitals_score.risk} risk)."
+        if vitals_score is not None and vitals_score.critical:
+            reasoning += " Critical vital signs: escalated without waiting for protocol retrieval."
 
         recommendations = []
-        if is_emergency:
+        if is_emergency or (vitals_score is not None and vitals_score.critical):
             recommendations.append("SEEK EMERGENCY MEDICAL ATTENTION IMMEDIATELY.")
         
         for p in retrieved_protocols:
@@ -111,7 +292,7 @@ class SymptomIntelligenceEngine:
         if not recommendations:
             recommendations.append("Monitor symptoms and maintain hydration. Consult a physician if condition worsens.")
 
-        return {
+        result = {
             "symptoms": extracted_symptoms,
             "triage_level": triage_level,
             "reasoning": reasoning,
@@ -119,10 +300,154 @@ class SymptomIntelligenceEngine:
             "recommendations": recommendations[:3],
             "safety_alerts": safety_alerts,
             "confidence_score": 0.92 if protocol_summaries else 0.82,
-            "disclaimer": "AI-generated decision support. Not a clinical diagnosis."
+            "disclaimer": "AI-generated decision support. Not a clinical diagnosis.",
+            "snapshot_version": snapshot_version,
+            "vitals_assessment": vitals_score.as_dict() if vitals_score is not None else None
         }
+        record_triage(result)
+        return result
+
+    async def analyze_stream(
+        self,
+        text: str,
+        vitals: Dict[str, Any] = None,
+        medications: List[str] = None,
+        existing_conditions: List[str] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Runs the pipeline and yields (event, payload) pairs as each stage completes:
+        red_flags, vitals, symptoms, safety_alerts, protocols and finally result.
+        The red-flag and vitals verdicts are taken before any expensive work; with
+        critical vitals the LLM and retrieval are skipped altogether.
+        """
+        text_red_flags = self.match_text_red_flags(text)
+        yield "red_flags", {"emergency": bool(text_red_flags), "red_flags": text_red_flags}
+        vitals_score = self.assess_vitals(vitals)
+        yield "vitals", vitals_score.as_dict()
 
+        # Safety checks do not depend on extraction, so start them right away
+        view = await self.pin_snapshots()
+        safety_task = asyncio.ensure_future(
+            medication_safety.check_interactions(medications or [], existing_conditions or [], view)
+        )
+        try:
+            if vitals_score.critical:
+                extraction_paths.inc("local")
+                symptoms = local_extractor.extract(text)
+            else:
+                symptoms = await self.extract_symptoms(text)
+            yield "symptoms", symptoms
+
+            symptom_names = [s["name"] for s in symptoms]
+            retrieval_task = asyncio.ensure_future(
+                self._no_protocols() if vitals_score.critical else self.retrieve_clinical_guidelines(symptom_names, view)
+            )
+            try:
+                safety_alerts = await safety_task
+                yield "safety_alerts", safety_alerts
+
+                retrieved_protocols = await retrieval_task
+                yield "protocols", retrieved_protocols
+            finally:
+                retrieval_task.cancel()
+        finally:
+            safety_task.cancel()
+
+        # Keep the final verdict consistent with the early red-flag event
+        red_flags = list(dict.fromkeys(text_red_flags + await self.match_red_flags(symptom_names)))
+        yield "result", self.build_triage(
+            symptoms, red_flags, retrieved_protocols, safety_alerts,
+            snapshot_version=snapshots.version(view), vitals_score=vitals_score
+        )
+
+    async def analyze_batch(
+        self,
+        cases: List[Dict[str, Any]],
+        concurrency: int = 8,
+        admit: Callable[[Dict[str, Any]], AsyncContextManager] = None
+    ) -> List[Any]:
+        """
+        Runs many cases through extraction and triage with a bounded concurrency limit.
+        Identical texts, symptom sets and medication/condition lists share a single lookup.
+        Vitals are scored for the whole batch up front (vectorized); cases with
+        critical vitals skip the LLM and protocol retrieval.
+        `admit(case)` wraps the work of each case, e.g. in an admission slot of
+        the case's own priority lane.
+        Returns one entry per case in input order: the analysis dict, or the exception raised for that case.
+        """
+        with stage_timer("vitals"):
+            vitals_batch = score_vitals_batch(encode_vitals_batch([c.get("vitals") for c in cases]))
+        critical = vitals_batch["critical"].tolist()
+        vitals_scores = vitals_scores_from_batch(vitals_batch)
+
+        # The whole batch is evaluated against one data generation
+        view = await self.pin_snapshots()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        extractions: Dict[Any, asyncio.Future] = {}
+        retrievals: Dict[Any, asyncio.Future] = {}
+        safety_checks: Dict[Any, asyncio.Future] = {}
+
+        def shared(memo: Dict[Any, asyncio.Future], key: Any, factory) -> asyncio.Future:
+            if key not in memo:
+                memo[key] = asyncio.ensure_future(factory())
+            return memo[key]
+
+        admit = admit or (lambda case: contextlib.nullcontext())
+
+        async def run_case(case: Dict[str, Any], is_critical: bool) -> Dict[str, Any]:
+            if is_critical:
+                async with admit(case):
+                    return await analyze_case(case, is_critical)
+            async with semaphore:
+                async with admit(case):
+                    return await analyze_case(case, is_critical)
+
+        async def analyze_case(case: Dict[str, Any], is_critical: bool) -> Dict[str, Any]:
+            if is_critical:
+                # Emergencies by vitals are decided locally and never queue behind the semaphore
+                extraction_paths.inc("local")
+                symptoms = local_extractor.extract(case["text"])
+                red_flags, safety_alerts = await asyncio.gather(
+                    self.match_red_flags([s["name"] for s in symptoms]),
+                    medication_safety.check_interactions(
+                        case.get("medications") or [], case.get("existing_conditions") or [], view
+                    )
+                )
+                return symptoms, self._merge_red_flags(case["text"], red_flags), [], safety_alerts
+
+            text = case["text"]
+            medications = case.get("medications") or []
+            conditions = case.get("existing_conditions") or []
+
+            symptoms = await shared(extractions, text.strip(), lambda: self.extract_symptoms(text))
+            symptom_names = [s["name"] for s in symptoms]
+            safety_key = (
+                tuple(ontology.canonical_medication(m) for m in medications),
+                tuple(ontology.canonical_condition(c) for c in conditions)
+            )
+            red_flags, retrieved_protocols, safety_alerts = await asyncio.gather(
+                self.match_red_flags(symptom_names),
+                shared(retrievals, tuple(symptom_names), lambda: self.retrieve_clinical_guidelines(symptom_names, view)),
+                shared(safety_checks, safety_key, lambda: medication_safety.check_interactions(medications, conditions, view))
+            )
+            return symptoms, self._merge_red_flags(text, red_flags), retrieved_protocols, safety_alerts
+
+        outcomes = await asyncio.gather(
+            *(run_case(c, is_critical) for c, is_critical in zip(cases, critical)), return_exceptions=True
+        )
 
+        # Evaluate the triage rules once, vectorized over every successful case
+        succeeded = [i for i, o in enumerate(outcomes) if not isinstance(o, BaseException)]
+        features = triage_rules.encode_batch([
+            triage_rules.features(outcomes[i][0], outcomes[i][1], outcomes[i][3], vitals_scores[i]) for i in succeeded
+        ])
+        levels = triage_rules.evaluate_batch(features) if succeeded else []
+        for i, level in zip(succeeded, levels):
+            outcomes[i] = self.build_triage(
+                *outcomes[i], triage_level=triage_rules.levels[level], snapshot_version=snapshots.version(view),
+                vitals_score=vitals_scores[i]
+            )
+        return outcomes
 
 
 # Singleton instance
@@ -0,0 +1,242 @@
+"""
+Offline bulk triage over large case files, for retrospective audits.
+
+Streams cases from JSONL or CSV, fans them out in chunks over a process pool
+(one worker per core by default) with a bounded number of chunks in flight,
+and appends AnalysisResponse-shaped results to a JSONL file in input order.
+A checkpoint next to the output records how far the output is complete, so
+an interrupted run continues where it stopped:
+
+    python -m backend.bulk_triage cases.jsonl results.jsonl --workers 8
+    python -m backend.bulk_triage cases.jsonl results.jsonl --resume
+
+CSV files need a `text` column and may carry `id`, `medications` and
+`existing_conditions` (';'-separated) and `vitals` (a JSON object).
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+Case = Tuple[int, Any]
+
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def iter_cases(path: str) -> Iterator[Case]:
+    """
+    Streams (index, raw case) pairs without loading the file. JSONL lines are
+    passed on unparsed so decoding happens in the worker processes.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            yield from enumerate(csv.DictReader(f))
+        else:
+            index = 0
+            for line in f:
+                if line.strip():
+                    yield index, line
+                    index += 1
+
+
+def _split(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return value
+    return [v.strip() for v in (value or "").split(";") if v.strip()]
+
+
+def parse_case(raw: Any) -> Dict[str, Any]:
+    """
+    Turns a JSONL line or CSV row into SymptomRequest fields plus its id.
+    """
+    case = json.loads(raw) if isinstance(raw, str) else dict(raw)
+    vitals = case.get("vitals")
+    if isinstance(vitals, str):
+        vitals = json.loads(vitals) if vitals.strip() else None
+    return {
+        "id": case.get("id"),
+        "text": case.get("text") or "",
+        "vitals": vitals,
+        "medications": _split(case.get("medications")),
+        "existing_conditions": _split(case.get("existing_conditions")),
+    }
+
+
+def _chunks(cases: Iterator[Case], size: int) -> Iterator[List[Case]]:
+    while True:
+        chunk = list(itertools.islice(cases, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ------------------------------------------------------------------ workers
+
+def _init_worker():
+    global _worker_loop
+    from .lifecycle import lifecycle
+    _worker_loop = asyncio.new_event_loop()
+    lifecycle.warm_up()
+
+
+def _run_chunk(chunk: List[Case], concurrency: int) -> Tuple[List[str], int]:
+    """
+    Triage one chunk in a worker; returns the serialized output lines in chunk
+    order and how many of them are errors.
+    """
+    from fastapi.encoders import jsonable_encoder
+    from .ai_pipeline import engine
+    from .schemas import AnalysisResponse, SymptomRequest
+
+    lines: List[Optional[str]] = [None] * len(chunk)
+    errors = 0
+    valid: List[Tuple[int, int, Any, Any]] = []
+    for position, (index, raw) in enumerate(chunk):
+        try:
+            case = parse_case(raw)
+            request = SymptomRequest(**{k: v for k, v in case.items() if k != "id"})
+            valid.append((position, index, case["id"], request))
+        except Exception as exc:
+            errors += 1
+            lines[position] = json.dumps({"index": index, "id": None, "error": f"Invalid case: {exc}"})
+
+    results = _worker_loop.run_until_complete(engine.analyze_batch(
+        [{"text": r.text, "vitals": r.vitals, "medications": r.medications, "existing_conditions": r.existing_conditions}
+         for _, _, _, r in valid],
+        concurrency
+    ))
+    for (position, index, case_id, _), result in zip(valid, results):
+        if isinstance(result, Exception):
+            errors += 1
+            item = {"index": index, "id": case_id, "error": f"{type(result).__name__}: {result}"}
+        else:
+            item = {"index": index, "id": case_id, "result": jsonable_encoder(AnalysisResponse(**result))}
+        lines[position] = json.dumps(item)
+    return lines, errors
+
+
+# ------------------------------------------------------------------- driver
+
+def _read_checkpoint(path: str, input_path: str) -> Tuple[int, int]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0, 0
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        raise SystemExit(f"Checkpoint {path} belongs to {checkpoint.get('input')}, not {input_path}.")
+    return checkpoint["cases_done"], checkpoint["output_bytes"]
+
+
+def _write_checkpoint(path: str, input_path: str, cases_done: int, output_bytes: int):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "cases_done": cases_done, "output_bytes": output_bytes}, f)
+    os.replace(tmp, path)
+
+
+def run_bulk_triage(
+    input_path: str,
+    output_path: str,
+    workers: Optional[int] = None,
+    chunk_size: int = 256,
+    max_in_flight: Optional[int] = None,
+    concurrency: int = 16,
+    resume: bool = False,
+) -> Dict[str, Any]:
+    """
+    Processes every case in input_path and returns run statistics.
+    """
+    from .lifecycle import lifecycle
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    checkpoint_path = output_path + ".checkpoint"
+    skip, output_bytes = _read_checkpoint(checkpoint_path, input_path) if resume else (0, 0)
+
+    # Read-only indexes are built once here and inherited by the forked workers
+    lifecycle.prepare_shared()
+
+    out = open(output_path, "r+" if skip and os.path.exists(output_path) else "w", encoding="utf-8")
+    # Drop anything written after the last checkpoint
+    out.truncate(output_bytes)
+    out.seek(output_bytes)
+
+    chunks = enumerate(_chunks(itertools.islice(iter_cases(input_path), skip, None), chunk_size))
+    pending: Dict[Any, int] = {}
+    finished: Dict[int, Tuple[List[str], int]] = {}
+    next_seq = 0
+    done = skip
+    errors = 0
+    started = time.perf_counter()
+
+    with out, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        def fill():
+            # Completed-but-unwritten chunks count against the window, keeping memory bounded
+            while len(pending) + len(finished) < max_in_flight:
+                item = next(chunks, None)
+                if item is None:
+                    return
+                seq, chunk = item
+                pending[pool.submit(_run_chunk, chunk, concurrency)] = seq
+
+        fill()
+        while pending:
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                finished[pending.pop(future)] = future.result()
+
+            flushed = False
+            while next_seq in finished:
+                lines, chunk_errors = finished.pop(next_seq)
+                out.write("\n".join(lines) + "\n")
+                done += len(lines)
+                errors += chunk_errors
+                next_seq += 1
+                flushed = True
+            if flushed:
+                out.flush()
+                _write_checkpoint(checkpoint_path, input_path, done, out.tell())
+                elapsed = time.perf_counter() - started
+                print(f"Triaged {done} cases ({errors} errors) - {(done - skip) / elapsed:.0f} cases/s", file=sys.stderr)
+            fill()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "cases": done,
+        "processed": done - skip,
+        "resumed_from": skip,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "cases_per_s": round((done - skip) / elapsed, 2) if elapsed else 0.0,
+        "workers": workers,
+    }
+    print(json.dumps(stats))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Triage a large JSONL or CSV case file across all cores.")
+    parser.add_argument("input", help="JSONL or CSV case file")
+    parser.add_argument("output", help="JSONL results file (one {index, id, result|error} object per case)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Cases sent to a worker at a time")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Chunks queued or unwritten at once (default: 2 per worker)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent cases within a worker")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint next to the output")
+    parser.add_argument("--local-only", action="store_true", help="Never call the LLM; use the local extractor for every case")
+    args = parser.parse_args()
+
+    if args.local_only:
+        # Read by the engine in each worker
+        os.environ["LOCAL_EXTRACTION_MIN_CONFIDENCE"] = "0"
+        os.environ["OPENAI_API_KEY"] = ""
+    run_bulk_triage(
+        args.input, args.output, args.workers, args.chunk_size, args.max_in_flight, args.concurrency, args.resume
+    )
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-memory cache with LRU eviction and an optional time-to-live.
+    Thread-safe, and keeps hit/miss/eviction counters for monitoring.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls for the same key: the first caller runs the
+    factory and everyone else awaits the same in-flight result.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield() keeps one caller's cancellation from cancelling the shared call
+        return await asyncio.shield(future)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class PersistentCache:
+    """
+    Disk-backed JSON cache on SQLite that survives restarts and can be shared by
+    worker processes. Entries older than max_age seconds are ignored and purged,
+    and the least recently used entries are trimmed beyond max_entries.
+    Async callers use get_async()/set_async(), which run the SQLite work on the
+    cache's own I/O thread so disk access never blocks the event loop.
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000, max_age: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age or None
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._io: Optional[ThreadPoolExecutor] = None
+        self._io_pid: Optional[int] = None
+
+    def _connection(self):
+        # Opened lazily so importing the engine never touches the disk
+        if self._conn is None:
+            import sqlite3
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and (self.max_age is None or row[1] >= now - self.max_age):
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._writes += 1
+            # Amortize eviction: purge expired and surplus rows every 100 writes
+            if self._writes % 100 == 1:
+                self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        if self.max_age is not None:
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.max_age,))
+        conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def _io_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive fork: each worker process starts its own I/O thread
+        if self._io is None or self._io_pid != os.getpid():
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistent-cache")
+            self._io_pid = os.getpid()
+        return self._io
+
+    async def get_async(self, key: str, default: Any = MISSING) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._io_executor(), self.get, key, default)
+
+    async def set_async(self, key: str, value: Any):
+        await asyncio.get_running_loop().run_in_executor(self._io_executor(), self.set, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self):
+        if self._io is not None and self._io_pid == os.getpid():
+            # Lets queued writes finish before the connection closes
+            self._io.shutdown(wait=True)
+        self._io = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .cache import TTLCache, MISSING
+from .metrics import registry, register_cache, Histogram
+
+logger = logging.getLogger(__name__)
+
+embedding_batch_size = registry.register(Histogram(
+    "embedding_batch_size", "Texts sent to the embedding model per call.", (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+))
+
+
+def default_embedding_model() -> Callable[[List[str]], Sequence[Sequence[float]]]:
+    """
+    Chroma's default ONNX MiniLM embedding function, the model the collection was ingested with.
+    """
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+class _Pending(NamedTuple):
+    texts: List[str]
+    future: Future
+
+
+class EmbeddingService:
+    """
+    Micro-batching front end for the embedding model.
+
+    Callers on any thread (or event loop) queue their texts and get a future. A
+    single batcher thread takes the first waiting request, keeps collecting
+    until it holds `max_batch_size` texts or `max_wait` seconds have passed,
+    and runs the model once for the distinct texts of the whole batch. Under
+    load, many one- or two-symptom lookups become one inference call; an idle
+    request waits at most `max_wait`. Embeddings of recent texts are kept in an
+    LRU, so common symptoms skip the model entirely.
+    """
+
+    def __init__(self, load_model: Callable[[], Callable] = default_embedding_model):
+        self.max_batch_size = max(1, int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64")))
+        self.max_wait = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5")) / 1000
+        self.cache = TTLCache(max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")))
+        self._load_model = load_model
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._batcher: Optional[threading.Thread] = None
+        self._batcher_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+
+    @property
+    def model(self) -> Callable:
+        """
+        The embedding model, loaded on first use (raises if it is unavailable).
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def load(self) -> bool:
+        """
+        Loads the model if possible; returns whether embeddings are available.
+        """
+        try:
+            self.model
+            return True
+        except Exception:
+            logger.info("Embedding model unavailable", exc_info=True)
+            return False
+
+    def _ensure_batcher(self):
+        # Threads do not survive fork: a preloaded master's batcher is restarted in each worker
+        if self._batcher is not None and self._batcher_pid == os.getpid() and self._batcher.is_alive():
+            return
+        with self._start_lock:
+            if self._batcher is None or self._batcher_pid != os.getpid() or not self._batcher.is_alive():
+                if self._batcher_pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._batcher = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._batcher_pid = os.getpid()
+                self._batcher.start()
+
+    # ------------------------------------------------------------------ callers
+
+    def submit(self, texts: Sequence[str], cache: bool = True) -> "Future[List[np.ndarray]]":
+        """
+        Queues texts for embedding; the future resolves to one float32 vector per text.
+        Pass cache=False for one-off texts (e.g. documents at ingestion) so they do
+        not evict common query strings.
+        """
+        texts = list(texts)
+        result: Future = Future()
+        embeddings: List[Any] = [self.cache.get(t) if cache else MISSING for t in texts]
+        missing = sorted({t for t, e in zip(texts, embeddings) if e is MISSING})
+        if not missing:
+            result.set_result(embeddings)
+            return result
+
+        # Requests larger than a batch are split so each part fits one model call
+        parts = [missing[i:i + self.max_batch_size] for i in range(0, len(missing), self.max_batch_size)]
+        futures = [Future() for _ in parts]
+        remaining = [len(parts)]
+        lock = threading.Lock()
+
+        def part_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            if result.cancelled():
+                # The caller stopped waiting (e.g. embed_async timed out)
+                return
+            try:
+                computed: Dict[str, np.ndarray] = {}
+                for part, future in zip(parts, futures):
+                    computed.update(zip(part, future.result()))
+            except Exception as exc:
+                result.set_exception(exc)
+                return
+            if cache:
+                for text, embedding in computed.items():
+                    self.cache.set(text, embedding)
+            result.set_result([computed[t] if e is MISSING else e for t, e in zip(texts, embeddings)])
+
+        self._ensure_batcher()
+        for part, future in zip(parts, futures):
+            future.add_done_callback(part_done)
+            self._queue.put(_Pending(part, future))
+        return result
+
+    def embed(self, texts: Sequence[str], cache: bool = True) -> List[np.ndarray]:
+        """
+        Blocking embedding through the shared batches, for worker threads and scripts.
+        """
+        return self.submit(texts, cache).result()
+
+    async def embed_async(self, texts: Sequence[str], cache: bool = True) -> List[np.ndarray]:
+        """
+        Awaits the batched embeddings without tying up an executor thread while queued.
+        """
+        return await asyncio.wrap_future(self.submit(texts, cache))
+
+    # ------------------------------------------------------------------ batcher
+
+    def _collect(self, first: _Pending, carry: List[_Pending]) -> List[_Pending]:
+        """
+        Gathers requests behind `first` until the batch is full or max_wait has passed.
+        A request that would overflow the batch is carried over to the next one.
+        """
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            if size + len(item.texts) > self.max_batch_size:
+                carry.append(item)
+                break
+            batch.append(item)
+            size += len(item.texts)
+        return batch
+
+    def _run(self):
+        carry: List[_Pending] = []
+        while True:
+            first = carry.pop() if carry else self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first, carry)
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch: List[_Pending]):
+        # Any failure is handed to every caller of the batch; the batcher thread must never die
+        try:
+            # Concurrent callers often ask for the same symptom; each distinct text is embedded once
+            distinct = list(dict.fromkeys(t for item in batch for t in item.texts))
+            vectors = np.asarray(self.model(distinct), dtype=np.float32)
+            if len(vectors) != len(distinct):
+                raise ValueError(f"Embedding model returned {len(vectors)} vectors for {len(distinct)} texts.")
+            self.batches += 1
+            embedding_batch_size.observe(len(distinct))
+            by_text = dict(zip(distinct, vectors))
+            results = [[by_text[t] for t in item.texts] for item in batch]
+        except Exception as exc:
+            logger.warning("Embedding batch of %d requests failed: %s", len(batch), exc)
+            for item in batch:
+                item.future.set_exception(exc)
+            return
+        for item, result in zip(batch, results):
+            item.future.set_result(result)
+
+    def stop(self):
+        """
+        Lets the batcher finish the queued requests and exit.
+        """
+        if self._batcher is not None and self._batcher_pid == os.getpid():
+            self._queue.put(None)
+            # A later submit starts a fresh batcher on the same queue
+            self._batcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "queued": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "cache": self.cache.stats(),
+        }
+
+
+# Singleton instance
+embedding_service = EmbeddingService()
+register_cache("embedding", embedding_service.cache.stats)
@@ -0,0 +1,32 @@
+"""
+Multi-worker serving mode, one worker per core:
+
+    gunicorn -c backend/gunicorn.conf.py backend.main:app
+
+The app is preloaded in the master, which builds the read-only clinical data
+once (lifecycle.prepare_shared) before forking. The interaction table and the
+vector index are memory-mapped .npy files and the BM25 postings are numpy
+arrays, so workers share those pages rather than holding a copy each. Each
+worker reports its own resident/shared/private memory on /ready and /metrics.
+Build the vector index beforehand with `python -m backend.vector_index build`.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    from backend.lifecycle import lifecycle
+    lifecycle.prepare_shared()
+    server.log.info("Shared data prepared: %s", {k: v for k, v in lifecycle.timings.items() if k.startswith("shared.")})
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s attached to shared data", worker.pid)
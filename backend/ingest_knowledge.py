@@ -1,55 +1,160 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import argparse
+import csv
+import functools
+import hashlib
+import itertools
 import json
 import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List
 
-# Initialize ChromaDB client
-# In a real environment, this would be a persistent directory
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
+from .embedding_service import embedding_service
 
-# Use a standard embedding function (OpenAI or similar)
-# For hackathon demo, we can use a basic one or mock it if API keys are missing
-embedding_fn = embedding_functions.DefaultEmbeddingFunction()
 
-def ingest_medical_protocols():
-    collection = chroma_client.get_or_create_collection(
+@functools.lru_cache(maxsize=None)
+def get_chroma_client():
+    """
+    ChromaDB client, created on first use so importing this module stays cheap.
+    In a real environment, this would be a persistent directory.
+    """
+    import chromadb
+    return chromadb.PersistentClient(path=os.getenv("CHROMA_PATH", "./chroma_db"))
+
+
+def get_embedding_fn():
+    """
+    Standard embedding function (OpenAI or similar), loaded on first use.
+    Shared with the embedding service, which batches the ingestion calls.
+    """
+    return embedding_service.model
+
+# Sample expanded protocols (ingested when no source files are given)
+SAMPLE_PROTOCOLS = [
+    {
+        "id": "p1",
+        "condition": "Acute Chest Pain",
+        "source": "WHO Emergency Care",
+        "protocol": "Immediate ECG, oxygen if SpO2 < 94%, Aspirin 300mg. Triage to EMERGENCY.",
+        "keywords": ["chest pain", "pressure", "shortness of breath", "radiating pain"]
+    },
+    {
+        "id": "p2",
+        "condition": "Severe Abdominal Pain",
+        "source": "Clinical Triage Manual",
+        "protocol": "NPO (Nothing by mouth), assess for surgical abdomen (rigidity/rebound). Triage to URGENT/EMERGENCY.",
+        "keywords": ["stomach pain", "abdominal pain", "nausea", "vomiting"]
+    },
+    {
+        "id": "p3",
+        "condition": "High Fever",
+        "source": "WHO Pediatrics",
+        "protocol": "Check for neck stiffness/rash. Paracetamol for comfort. Hydration. Triage to ROUTINE/URGENT.",
+        "keywords": ["fever", "chills", "high temperature"]
+    }
+]
+
+
+def iter_protocol_file(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams protocols from a JSONL or CSV file without loading it into memory.
+    CSV files carry keywords as a ';'-separated column.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                row["keywords"] = [k.strip() for k in (row.get("keywords") or "").split(";") if k.strip()]
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def to_record(p: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the Chroma document and metadata for a protocol, tagged with a content hash.
+    """
+    document = f"{p['condition']}: {p['protocol']}"
+    metadata = {
+        "source": p["source"],
+        "condition": p["condition"],
+        "protocol": p["protocol"],
+        "keywords": ", ".join(p.get("keywords") or []),
+    }
+    digest = hashlib.sha256(json.dumps([document, metadata], sort_keys=True).encode("utf-8")).hexdigest()
+    metadata["content_hash"] = digest
+    return {"id": str(p["id"]), "document": document, "metadata": metadata}
+
+
+def _chunks(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ingest_medical_protocols(paths: List[str] = None, batch_size: int = 512, upsert_chunk_size: int = 256) -> Dict[str, Any]:
+    """
+    Incrementally ingests protocols: reads them in batches, skips rows whose content
+    hash is unchanged, embeds the changed rows in one call per batch and upserts
+    them in chunks. Returns ingestion statistics.
+    """
+    embedding_fn = get_embedding_fn()
+    collection = get_chroma_client().get_or_create_collection(
         name="medical_protocols",
         embedding_function=embedding_fn
     )
 
-    # Sample expanded protocols
-    protocols = [
-        {
-            "id": "p1",
-            "condition": "Acute Chest Pain",
-            "source": "WHO Emergency Care",
-            "protocol": "Immediate ECG, oxygen if SpO2 < 94%, Aspirin 300mg. Triage to EMERGENCY.",
-            "keywords": ["chest pain", "pressure", "shortness of breath", "radiating pain"]
-        },
-        {
-            "id": "p2",
-            "condition": "Severe Abdominal Pain",
-            "source": "Clinical Triage Manual",
-            "protocol": "NPO (Nothing by mouth), assess for surgical abdomen (rigidity/rebound). Triage to URGENT/EMERGENCY.",
-            "keywords": ["stomach pain", "abdominal pain", "nausea", "vomiting"]
-        },
-        {
-            "id": "p3",
-            "condition": "High Fever",
-            "source": "WHO Pediatrics",
-            "protocol": "Check for neck stiffness/rash. Paracetamol for comfort. Hydration. Triage to ROUTINE/URGENT.",
-            "keywords": ["fever", "chills", "high temperature"]
-        }
-    ]
-
-    for p in protocols:
-        collection.upsert(
-            documents=[f"{p['condition']}: {p['protocol']}"],
-            metadatas=[{"source": p["source"], "condition": p["condition"], "protocol": p["protocol"]}],
-            ids=[p["id"]]
+    protocols = itertools.chain.from_iterable(iter_protocol_file(p) for p in paths) if paths else SAMPLE_PROTOCOLS
+    stats = {"read": 0, "upserted": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    for batch in _chunks(protocols, batch_size):
+        # De-duplicate ids within the batch; the last occurrence wins
+        records = list({r["id"]: r for r in map(to_record, batch)}.values())
+        stats["read"] += len(batch)
+
+        existing = collection.get(ids=[r["id"] for r in records], include=["metadatas"])
+        known_hashes = {i: (m or {}).get("content_hash") for i, m in zip(existing["ids"], existing["metadatas"])}
+        changed = [r for r in records if known_hashes.get(r["id"]) != r["metadata"]["content_hash"]]
+        stats["skipped"] += len(records) - len(changed)
+
+        if changed:
+            # Same micro-batched path as query embeddings; documents stay out of its LRU
+            embeddings = embedding_service.embed([r["document"] for r in changed], cache=False)
+            for offset in range(0, len(changed), upsert_chunk_size):
+                part = changed[offset:offset + upsert_chunk_size]
+                collection.upsert(
+                    ids=[r["id"] for r in part],
+                    documents=[r["document"] for r in part],
+                    metadatas=[r["metadata"] for r in part],
+                    embeddings=embeddings[offset:offset + upsert_chunk_size]
+                )
+            stats["upserted"] += len(changed)
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"Processed {stats['read']} protocols "
+            f"({stats['upserted']} upserted, {stats['skipped']} unchanged) "
+            f"- {stats['read'] / elapsed if elapsed else 0:.0f} docs/s"
         )
-    
-    print(f"Ingested {len(protocols)} protocols into ChromaDB.")
+
+    if stats["upserted"]:
+        # Bump the collection version so knowledge-base caches are invalidated
+        metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+        metadata["version"] = str(time.time_ns())
+        collection.modify(metadata=metadata)
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"Ingested {stats['upserted']} protocols into ChromaDB ({stats['skipped']} unchanged) in {stats['seconds']}s.")
+    return stats
 
 if __name__ == "__main__":
-    ingest_medical_protocols()
+    parser = argparse.ArgumentParser(description="Ingest clinical protocols into ChromaDB.")
+    parser.add_argument("paths", nargs="*", help="JSONL or CSV protocol files (defaults to the built-in samples)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("INGEST_BATCH_SIZE", "512")), help="Protocols read and embedded per batch")
+    parser.add_argument("--upsert-chunk-size", type=int, default=int(os.getenv("INGEST_UPSERT_CHUNK_SIZE", "256")), help="Rows per collection.upsert call")
+    args = parser.parse_args()
+    ingest_medical_protocols(args.paths, args.batch_size, args.upsert_chunk_size)
@@ -0,0 +1,246 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_INTERACTIONS_PATH = os.path.join(DATA_DIR, "drug_interactions.csv")
+DEFAULT_CONTRAINDICATIONS_PATH = os.path.join(DATA_DIR, "condition_contraindications.csv")
+DEFAULT_INDEX_DIR = os.path.join(DATA_DIR, "interaction_index")
+
+DRUG_DRUG = 0
+DRUG_CONDITION = 1
+EMPTY = np.uint64(0)
+# Bump when the on-disk layout changes so stale compiled indexes are rebuilt
+INDEX_FORMAT = 2
+
+
+def normalize_name(name: str) -> str:
+    """
+    Canonical form used for index keys: lowercased with collapsed whitespace.
+    """
+    return " ".join(name.split()).lower()
+
+
+def _key(kind: int, a: str, b: str) -> Tuple[str, str]:
+    """
+    Lookup key of a pair: drug pairs are sorted so the key is unordered.
+    """
+    return (b, a) if kind == DRUG_DRUG and b < a else (a, b)
+
+
+def _key_hash(kind: int, a: str, b: str) -> int:
+    """
+    Stable 64-bit hash of a lookup key (Python's hash() is salted per process).
+    0 is reserved for empty slots.
+    """
+    a, b = _key(kind, a, b)
+    digest = hashlib.blake2b(f"{kind}|{a}|{b}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class StringTable:
+    """
+    Interned strings as one UTF-8 byte blob plus offsets, both plain arrays so a
+    saved table is memory-mapped and shared by worker processes like the rest of
+    the index. A string is only decoded when a lookup returns it.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob          # uint8[total bytes]
+        self.offsets = offsets    # int64[n + 1]; string i is blob[offsets[i]:offsets[i + 1]]
+
+    @classmethod
+    def from_list(cls, strings: List[str]) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __getitem__(self, index: int) -> str:
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes().decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class InteractionStore:
+    """
+    Compact, hash-indexed table of drug-drug interactions and drug-condition contraindications.
+
+    Rows are stored as integer ids into an interned string table, and lookups go
+    through an open-addressing hash table keyed on the normalized unordered drug
+    pair or (drug, condition). The arrays are saved as .npy files and loaded
+    memory-mapped, so worker processes share the same pages (strings included,
+    see StringTable).
+    """
+
+    def __init__(self, keys: np.ndarray, slots: np.ndarray, rows: np.ndarray, strings: StringTable):
+        self.keys = keys          # uint64[capacity], 0 = empty
+        self.slots = slots        # int32[capacity], row index for each occupied slot
+        self.rows = rows          # int32[n, 5]: kind, subject, object, risk, severity (string ids)
+        self.strings = strings
+        self._mask = len(keys) - 1
+
+    # ------------------------------------------------------------------ build
+
+    @classmethod
+    def build(cls, interactions: Iterable[Dict[str, str]], contraindications: Iterable[Dict[str, str]]) -> "InteractionStore":
+        strings: List[str] = []
+        string_ids: Dict[str, int] = {}
+
+        def intern(value: str) -> int:
+            value = value.strip()
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            return string_ids[value]
+
+        rows = []
+        hashes = []
+        for r in interactions:
+            rows.append((DRUG_DRUG, intern(r["med_a"]), intern(r["med_b"]), intern(r["risk"]), intern(r["severity"])))
+            hashes.append(_key_hash(DRUG_DRUG, normalize_name(r["med_a"]), normalize_name(r["med_b"])))
+        for r in contraindications:
+            rows.append((DRUG_CONDITION, intern(r["med"]), intern(r["condition"]), intern(r["risk"]), intern(r["severity"])))
+            hashes.append(_key_hash(DRUG_CONDITION, normalize_name(r["med"]), normalize_name(r["condition"])))
+
+        # Power-of-two capacity at <= 50% load keeps linear probe chains short
+        capacity = 1 << max(4, (2 * len(rows) - 1).bit_length())
+        keys = np.zeros(capacity, dtype=np.uint64)
+        slots = np.full(capacity, -1, dtype=np.int32)
+        mask = capacity - 1
+        for row_index, h in enumerate(hashes):
+            slot = h & mask
+            while keys[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            keys[slot] = h
+            slots[slot] = row_index
+
+        return cls(keys, slots, np.array(rows, dtype=np.int32).reshape(-1, 5), StringTable.from_list(strings))
+
+    @classmethod
+    def from_csv(cls, interactions_path: str, contraindications_path: str) -> "InteractionStore":
+        with open(interactions_path, newline="", encoding="utf-8") as fa, \
+             open(contraindications_path, newline="", encoding="utf-8") as fb:
+            return cls.build(csv.DictReader(fa), csv.DictReader(fb))
+
+    # ------------------------------------------------------------ persistence
+
+    def save(self, index_dir: str, manifest: Optional[Dict[str, Any]] = None):
+        """
+        Writes each file beside its target and renames it into place, manifest last.
+        Processes still mapping the previous files keep reading the old inodes.
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        arrays = (
+            ("keys.npy", self.keys), ("slots.npy", self.slots), ("rows.npy", self.rows),
+            ("strings.npy", self.strings.blob), ("string_offsets.npy", self.strings.offsets),
+        )
+        for name, array in arrays:
+            _replace(os.path.join(index_dir, name), lambda f, a=array: np.save(f, a), binary=True)
+        _replace(
+            os.path.join(index_dir, "manifest.json"),
+            lambda f: json.dump({**(manifest or {}), "format": INDEX_FORMAT}, f)
+        )
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True) -> "InteractionStore":
+        mode = "r" if mmap else None
+
+        def array(name: str) -> np.ndarray:
+            return np.load(os.path.join(index_dir, name), mmap_mode=mode)
+
+        return cls(
+            array("keys.npy"), array("slots.npy"), array("rows.npy"),
+            StringTable(array("strings.npy"), array("string_offsets.npy")),
+        )
+
+    @classmethod
+    def load_or_build(cls, interactions_path: str, contraindications_path: str, index_dir: str) -> "InteractionStore":
+        """
+        Loads the compiled index if it was built from the current source files,
+        otherwise compiles it from CSV (and saves it when the directory is writable).
+        """
+        signature = source_signature(interactions_path, contraindications_path)
+        try:
+            with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("sources") == signature and manifest.get("format") == INDEX_FORMAT:
+                return cls.load(index_dir)
+        except (OSError, ValueError):
+            pass
+
+        store = cls.from_csv(interactions_path, contraindications_path)
+        try:
+            store.save(index_dir, {"sources": signature})
+        except OSError:
+            return store
+        # Map the saved files so every worker process shares the same page-cache copy
+        return cls.load(index_dir)
+
+    # ---------------------------------------------------------------- lookups
+
+    def _lookup(self, kind: int, a: str, b: str) -> List[Dict[str, str]]:
+        h = _key_hash(kind, a, b)
+        key = _key(kind, a, b)
+        keys, slots, rows, strings = self.keys, self.slots, self.rows, self.strings
+        slot = h & self._mask
+        alerts = []
+        while keys[slot] != EMPTY:
+            if keys[slot] == h:
+                row_kind, subject, obj, risk, severity = (int(v) for v in rows[slots[slot]])
+                # A 64-bit hash can collide: only the row's own names make it a match
+                if row_kind == kind and _key(kind, normalize_name(strings[subject]), normalize_name(strings[obj])) == key:
+                    if kind == DRUG_DRUG:
+                        alerts.append({"med_a": strings[subject], "med_b": strings[obj], "risk": strings[risk], "severity": strings[severity]})
+                    else:
+                        alerts.append({"med": strings[subject], "condition": strings[obj], "risk": strings[risk], "severity": strings[severity]})
+            slot = (slot + 1) & self._mask
+        return alerts
+
+    def drug_interactions(self, med_a: str, med_b: str) -> List[Dict[str, str]]:
+        """
+        Interaction alerts for an unordered pair of normalized medication names.
+        """
+        return self._lookup(DRUG_DRUG, med_a, med_b)
+
+    def condition_contraindications(self, med: str, condition: str) -> List[Dict[str, str]]:
+        """
+        Contraindication alerts for a normalized (medication, condition) pair.
+        """
+        return self._lookup(DRUG_CONDITION, med, condition)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+def source_signature(*paths: str) -> List[List[Any]]:
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+def _replace(path: str, write, binary: bool = False):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb" if binary else "w", **({} if binary else {"encoding": "utf-8"})) as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile interaction CSVs into a memory-mappable index.")
+    parser.add_argument("--interactions", default=DEFAULT_INTERACTIONS_PATH, help="CSV with med_a,med_b,risk,severity")
+    parser.add_argument("--contraindications", default=DEFAULT_CONTRAINDICATIONS_PATH, help="CSV with med,condition,risk,severity")
+    parser.add_argument("--out", default=DEFAULT_INDEX_DIR, help="Output directory for the compiled index")
+    args = parser.parse_args()
+
+    store = InteractionStore.from_csv(args.interactions, args.contraindications)
+    store.save(args.out, {"sources": source_signature(args.interactions, args.contraindications)})
+    print(f"Compiled {len(store)} interaction rows into {args.out}.")
@@ -1,5 +1,20 @@
+import asyncio
 import os
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Mapping, NamedTuple, Optional, Tuple
+
+from .cache import TTLCache, SingleFlight, MISSING
+from .embedding_service import embedding_service
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .metrics import record_retrieval, register_cache
+from .snapshots import Snapshot, snapshots
+from .vector_index import VectorIndex, DEFAULT_CHROMA_PATH, DEFAULT_VECTOR_INDEX_DIR
+
+class ProtocolIndexes(NamedTuple):
+    vector_index: Optional[VectorIndex]
+    lexical_index: LexicalIndex
+
 
 class MedicalKnowledgeBase:
     """
@@ -23,42 +38,240 @@ class MedicalKnowledgeBase:
             {"condition": "Fever", "protocol": "Increase fluid intake. Paracetamol for fever >38.5C. Monitor for rash.", "source": "General Practice Protocols"}
         ]
         
-        # ChromaDB Initialization (Optional)
+        # ChromaDB and the embedding model are opened lazily by connect() (see lifecycle.py);
+        # the vector and BM25 indexes live in the hot-reloadable "protocols" snapshot
+        self.use_vector_db = False
+        self.use_embeddings = False
+        self.top_k = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+        # Upper bound on waiting for query embeddings before falling back to keyword search
+        self.embedding_timeout = float(os.getenv("RETRIEVAL_EMBEDDING_TIMEOUT", "5"))
+        # BM25 is the fallback when no semantic results exist; set RETRIEVAL_FUSION=rrf to also fuse it into them
+        self.fusion = os.getenv("RETRIEVAL_FUSION", "none")
+        self.vector_index_dir = os.getenv("VECTOR_INDEX_DIR", DEFAULT_VECTOR_INDEX_DIR)
+        self.connected = False
+        self._connect_lock = threading.Lock()
+
+        # Retrieval result cache, keyed on the protocol snapshot and canonical symptom set
+        self.cache = TTLCache(
+            max_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+        )
+        self._inflight = SingleFlight()
+        register_cache("retrieval", self.cache.stats)
+        self._generation = 0
+
+        # Embedding and vector queries are blocking; they run here instead of on the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RETRIEVAL_WORKERS", "4")),
+            thread_name_prefix="retrieval"
+        )
+
+    def connect(self):
+        """
+        Opens ChromaDB and the embedding model and loads the protocol indexes.
+        Idempotent and thread-safe; called by the startup hook or, failing that,
+        by the first retrieval.
+        """
+        with self._connect_lock:
+            if self.connected:
+                return
+
+            # ChromaDB Initialization (Optional)
+            try:
+                import chromadb
+                self.chroma_client = chromadb.PersistentClient(path=os.getenv("CHROMA_PATH", DEFAULT_CHROMA_PATH))
+                self.collection = self.chroma_client.get_collection("medical_protocols")
+                self.use_vector_db = True
+            except Exception:
+                self.use_vector_db = False
+            # Indexes built before connecting (e.g. preloaded) could not see the collection yet
+            snapshots.reload("collection")
+
+            # Query embeddings come from the shared micro-batching service (see embedding_service.py).
+            # Without them the mapped metadata still backs the BM25 index.
+            if self.use_vector_db or self.load_indexes().vector_index is not None:
+                self.use_embeddings = embedding_service.load()
+
+            self.connected = True
+
+    def protocol_signature(self) -> List[Any]:
+        """
+        Cheap change detector for the protocol indexes: the vector index files.
+        """
+        signature: List[Any] = []
+        for name in ("embeddings.npy", "metadata.json"):
+            try:
+                stat = os.stat(os.path.join(self.vector_index_dir, name))
+                signature.append([name, stat.st_size, stat.st_mtime_ns])
+            except OSError:
+                signature.append([name, None])
+        return signature
+
+    def collection_signature(self) -> Optional[List[Any]]:
+        """
+        Version and size of the Chroma collection queried live, once connected.
+        A re-ingest changes it, which invalidates cached retrievals.
+        """
+        if not self.use_vector_db:
+            return None
         try:
-            import chromadb
-            self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
-            self.collection = self.chroma_client.get_collection("medical_protocols")
-            self.use_vector_db = True
+            collection = self.chroma_client.get_collection("medical_protocols")
+            return [(collection.metadata or {}).get("version"), collection.count()]
         except Exception:
-            self.use_vector_db = False
+            return None
+
+    def build_protocol_indexes(self) -> ProtocolIndexes:
+        """
+        Maps the vector index and builds the BM25 index over the same corpus
+        (else the built-in protocols). Opens no threads or connections.
+        """
+        try:
+            vector_index = VectorIndex.load(self.vector_index_dir)
+        except Exception:
+            vector_index = None
+        corpus = vector_index.metadatas if vector_index is not None else self.protocols
+        return ProtocolIndexes(vector_index, LexicalIndex(corpus))
+
+    def load_indexes(self) -> ProtocolIndexes:
+        """
+        The active protocol indexes, built on first use. A preloading server can
+        call this once before forking workers, which then share the pages
+        (see gunicorn.conf.py).
+        """
+        return snapshots.get("protocols").data
+
+    def warm_up_embeddings(self):
+        """
+        Forces the embedding model to load and pages in the index so the first request does not pay for it.
+        """
+        self.connect()
+        vector_index = self.load_indexes().vector_index
+        if not self.use_embeddings:
+            return
+        embeddings = embedding_service.embed(["warm up"], cache=False)
+        if vector_index is not None:
+            vector_index.query(embeddings, n_results=1)
+        elif self.use_vector_db:
+            self.collection.query(query_embeddings=[e.tolist() for e in embeddings], n_results=1)
+
+    def invalidate(self):
+        """
+        Drops cached retrievals, e.g. after the protocol collection was re-ingested in-process.
+        """
+        self._generation += 1
+        self.cache.clear()
+
+    @staticmethod
+    def canonical_symptoms(symptoms: List[str]) -> Tuple[str, ...]:
+        """
+        Order- and case-insensitive cache key for a symptom list.
+        """
+        return tuple(sorted({" ".join(s.split()).lower() for s in symptoms if s.strip()}))
+
+    async def retrieve(self, symptoms: List[str], view: Mapping[str, Snapshot] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieve relevant protocols, served from the result cache when possible.
+        Concurrent misses for the same symptom set share one lookup. `view` pins
+        the snapshot generation (see snapshots.py); by default the active one is used.
+        Results of a degraded lookup (the embedding or a vector query failed and
+        keyword search stood in) are not cached, so the next request retries the
+        semantic path once it recovers.
+        """
+        loop = asyncio.get_running_loop()
+        if not self.connected:
+            await loop.run_in_executor(self.executor, self.connect)
+        if view is None:
+            view = await snapshots.view_async(self.executor)
+
+        canonical = self.canonical_symptoms(symptoms)
+        key = (self._generation, view["protocols"].version, view["collection"].version, canonical)
+        cached = self.cache.get(key)
+        if cached is MISSING:
+            async def lookup():
+                result, degraded = await self._retrieve_uncached(list(canonical), view["protocols"].data)
+                if not degraded:
+                    self.cache.set(key, result)
+                return result
+
+            cached = await self._inflight.run(key, lookup)
+
+        record_retrieval(cached)
+        return list(cached)
 
-    async def retrieve(self, symptoms: List[str]) -> List[Dict[str, Any]]:
+    async def _retrieve_uncached(self, symptoms: List[str], indexes: ProtocolIndexes) -> Tuple[List[Dict[str, Any]], bool]:
         """
-        Retrieve relevant protocols using semantic search (Vector DB) 
-        or keyword fallback.
+        Embeds the symptoms through the shared micro-batches, then runs the
+        blocking lookup on the bounded retrieval pool so a slow vector query
+        never stalls the event loop. Returns (protocols, degraded).
         """
-        if self.use_vector_db:
+        embeddings = None
+        embedding_failed = False
+        if self.use_embeddings and symptoms:
             try:
-                results = self.collection.query(
-                    query_texts=symptoms,
-                    n_results=2
-                )
+                embeddings = await asyncio.wait_for(embedding_service.embed_async(symptoms), self.embedding_timeout)
+            except Exception:
+                embedding_failed = True
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self._retrieve_sync, symptoms, indexes, embeddings, embedding_failed
+        )
+
+    def _retrieve_sync(
+        self,
+        symptoms: List[str],
+        indexes: ProtocolIndexes,
+        embeddings: Optional[List[Any]] = None,
+        embedding_failed: bool = False
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Retrieve relevant protocols using the in-process vector index,
+        semantic search (Vector DB), falling back to BM25 keyword search. With
+        RETRIEVAL_FUSION=rrf, vector and keyword rankings are fused with
+        reciprocal rank fusion when both exist.
+        Returns (protocols, degraded): degraded when the embedding or a vector
+        query failed and keyword search had to stand in for it.
+        """
+        semantic = None
+        failed = embedding_failed
+        if indexes.vector_index is not None and embeddings is not None:
+            try:
+                results = indexes.vector_index.query(embeddings, n_results=2)
+                semantic = [metadata for metadata_list in results for metadata in metadata_list]
+            except Exception:
+                failed = True
+
+        if semantic is None and self.use_vector_db:
+            try:
+                if embeddings is not None:
+                    results = self.collection.query(query_embeddings=[e.tolist() for e in embeddings], n_results=2)
+                else:
+                    results = self.collection.query(query_texts=symptoms, n_results=2)
                 # Flatten and format results
-                flat_results = []
+                semantic = []
                 for metadata_list in results['metadatas']:
                     for metadata in metadata_list:
-                        flat_results.append(metadata)
-                return flat_results
+                        semantic.append(metadata)
             except Exception:
-                pass
+                semantic = None
+                failed = True
+
+        degraded = failed and semantic is None
+        if semantic is not None and self.fusion != "rrf":
+            return semantic, degraded
 
-        # Fallback: Simple keyword matching
-        matches = []
-        for s in symptoms:
-            for p in self.protocols:
-                if s.lower() in p["condition"].lower():
-                    matches.append(p)
-        return matches[:3]
+        lexical = [protocol for protocol, _ in indexes.lexical_index.search(" ".join(symptoms), top_k=self.top_k)]
+        if semantic is None:
+            return lexical, degraded
+        return reciprocal_rank_fusion([semantic, lexical], top_k=max(self.top_k, len(semantic))), degraded
 
 # Singleton instance
 knowledge_base = MedicalKnowledgeBase()
+# Cache keys carry both versions, so superseded entries would never be read again
+snapshots.register(
+    "protocols", knowledge_base.protocol_signature, knowledge_base.build_protocol_indexes,
+    on_swap=lambda snapshot: knowledge_base.cache.clear()
+)
+snapshots.register(
+    "collection", knowledge_base.collection_signature, knowledge_base.collection_signature,
+    on_swap=lambda snapshot: knowledge_base.cache.clear()
+)
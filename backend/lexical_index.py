@@ -0,0 +1,129 @@
+from collections import Counter
+from typing import Any, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from .text_matching import tokenize
+
+# Repeating a field's tokens is the usual cheap stand-in for BM25F field weights
+FIELD_WEIGHTS = {"condition": 3, "symptoms": 2, "protocol": 1}
+STOPWORDS = {"a", "an", "and", "the", "of", "for", "if", "in", "on", "or", "to", "with", "is", "be", "no", "as", "at", "by"}
+
+
+def protocol_key(protocol: Dict[str, Any]) -> Hashable:
+    """
+    Identity of a protocol across sources: its id, else its condition and text.
+    """
+    return protocol.get("id") or (protocol.get("condition"), protocol.get("protocol"))
+
+
+def _symptom_phrases(protocol: Dict[str, Any]) -> List[str]:
+    # In-memory protocols carry a symptoms list; ingested metadata a comma-joined keywords string
+    symptoms = protocol.get("symptoms") or protocol.get("keywords") or ""
+    return list(symptoms) if isinstance(symptoms, (list, tuple)) else str(symptoms).split(",")
+
+
+def _analyze(text: str) -> List[str]:
+    return [t for t in tokenize(text) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Inverted index with Okapi BM25 scoring over protocol condition, symptom and text fields.
+
+    A protocol is only a hit when the query contains its whole condition or one
+    of its symptom phrases: BM25 then ranks those hits. Sharing a generic word
+    ("pain" in "back pain" and "Chest Pain") is not enough to return a protocol.
+
+    The document-dependent part of BM25 is fixed once the corpus is, so each posting
+    stores its precomputed term weight and a query is a handful of vectorized
+    scatter-adds over the postings of its terms. Cost grows with the postings
+    touched, not with the number of protocols.
+    """
+
+    def __init__(self, protocols: Iterable[Dict[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.protocols: List[Dict[str, Any]] = []
+        self.vocabulary: Dict[str, int] = {}
+        seen = set()
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        lengths: List[int] = []
+        # Per protocol, the token sets of its condition and symptom phrases
+        self._anchors: List[List[frozenset]] = []
+        for protocol in protocols:
+            key = protocol_key(protocol)
+            if key in seen:
+                continue
+            seen.add(key)
+            doc = len(self.protocols)
+            self.protocols.append(protocol)
+            tokens = []
+            tokens += _analyze(protocol.get("condition", "")) * FIELD_WEIGHTS["condition"]
+            symptom_phrases = _symptom_phrases(protocol)
+            tokens += _analyze(" ".join(symptom_phrases)) * FIELD_WEIGHTS["symptoms"]
+            tokens += _analyze(protocol.get("protocol", "")) * FIELD_WEIGHTS["protocol"]
+            lengths.append(len(tokens))
+            anchors = {frozenset(_analyze(phrase)) for phrase in [protocol.get("condition", "")] + symptom_phrases}
+            self._anchors.append([anchor for anchor in anchors if anchor])
+            for token, tf in Counter(tokens).items():
+                term_ids.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                doc_ids.append(doc)
+                term_freqs.append(tf)
+
+        # Postings in CSR layout: term t owns doc_ids[offsets[t]:offsets[t + 1]]
+        terms = np.asarray(term_ids, dtype=np.int64)
+        docs = np.asarray(doc_ids, dtype=np.int32)
+        tf = np.asarray(term_freqs, dtype=np.float32)
+        doc_lengths = np.asarray(lengths, dtype=np.float32)
+        avg_length = float(doc_lengths.mean()) if len(lengths) else 1.0
+
+        df = np.bincount(terms, minlength=len(self.vocabulary)).astype(np.float32)
+        idf = np.log1p((len(self.protocols) - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * doc_lengths[docs] / avg_length)
+        weights = idf[terms] * tf * (k1 + 1) / (tf + norm)
+
+        order = np.argsort(terms, kind="stable")
+        self._doc_ids = docs[order]
+        self._weights = weights[order].astype(np.float32)
+        self._offsets = np.concatenate(([0], np.cumsum(df, dtype=np.int64)))
+
+    def __len__(self) -> int:
+        return len(self.protocols)
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Returns up to top_k (protocol, score) pairs, best first. Protocols whose
+        condition or symptom phrases are not fully contained in the query are left out.
+        """
+        query_terms = set(_analyze(query))
+        scores = np.zeros(len(self.protocols), dtype=np.float32)
+        for token in query_terms:
+            term = self.vocabulary.get(token)
+            if term is not None:
+                start, end = self._offsets[term], self._offsets[term + 1]
+                scores[self._doc_ids[start:end]] += self._weights[start:end]
+
+        hits = np.array(
+            [i for i in np.flatnonzero(scores) if any(anchor <= query_terms for anchor in self._anchors[i])],
+            dtype=np.int64
+        )
+        if len(hits) > top_k:
+            hits = np.sort(hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]])
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(self.protocols[i], float(scores[i])) for i in hits]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Dict[str, Any]]], top_k: int, k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Merges ranked protocol lists by summed 1 / (k + rank), deduplicated by protocol_key.
+    """
+    scores: Dict[Hashable, float] = {}
+    protocols: Dict[Hashable, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, protocol in enumerate(ranking):
+            key = protocol_key(protocol)
+            protocols.setdefault(key, protocol)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [protocols[key] for key in ordered[:top_k]]
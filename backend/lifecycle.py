@@ -0,0 +1,138 @@
+import asyncio
+import importlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from .embedding_service import embedding_service
+from .metrics import process_memory
+from .snapshots import snapshots
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """
+    Startup hook and readiness state for the backend singletons.
+
+    Heavy resources (ChromaDB, the embedding model, the vector index and the
+    interaction table) are opened here instead of at import time. The optional
+    warm-up runs in the background so the process can answer /ready with 503
+    until everything is loaded. Every step is timed for the startup report.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.warming = False
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, name: str, seconds: float):
+        self.timings[name] = round(seconds, 4)
+
+    def _timed(self, name: str, fn):
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def import_singletons(self):
+        """
+        Imports the modules that own the backend singletons, timing each one;
+        ai_pipeline goes last so its timing doesn't include the other two.
+        """
+        for module in ("knowledge_base", "medication_checker", "ai_pipeline"):
+            self._timed(f"import.{module}", lambda: importlib.import_module(f".{module}", __package__))
+
+    def prepare_shared(self):
+        """
+        Builds the read-only data (interaction table, vector and BM25 indexes) in the
+        server master before workers fork, so they attach to it instead of each
+        loading a private copy. Per-process resources (Chroma, the embedding model,
+        thread pools) are still opened after the fork by warm_up().
+        """
+        from .knowledge_base import knowledge_base
+        from .medication_checker import medication_safety
+
+        started = time.perf_counter()
+        self.import_singletons()
+        self._timed("shared.interaction_table", lambda: medication_safety.store)
+        self._timed("shared.indexes", knowledge_base.load_indexes)
+        self.record("shared.total", time.perf_counter() - started)
+
+    def warm_up(self):
+        """
+        Blocking warm-up of every heavy resource; safe to call more than once.
+        """
+        from .knowledge_base import knowledge_base
+        from .medication_checker import medication_safety
+
+        started = time.perf_counter()
+        self._timed("warmup.knowledge_base_connect", knowledge_base.connect)
+        self._timed("warmup.embedding_model", knowledge_base.warm_up_embeddings)
+        self._timed("warmup.interaction_table", medication_safety.warm_up)
+        self.record("warmup.total", time.perf_counter() - started)
+
+    async def startup(self, warm: Optional[bool] = None):
+        """
+        Called from the FastAPI lifespan. Without warm-up the service is ready
+        immediately and resources load on first use.
+        """
+        if warm is None:
+            warm = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+        self.import_singletons()
+        # Per process (after any fork): polls the data sources and hot-swaps new snapshots
+        snapshots.start()
+        if not warm:
+            self.ready = True
+            return
+        self.warming = True
+        self._task = asyncio.ensure_future(self._run_warm_up())
+
+    async def _run_warm_up(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.warm_up)
+        except Exception as exc:
+            # Resources still load lazily on first use; report the failure but serve traffic
+            self.error = f"{type(exc).__name__}: {exc}"
+            logger.exception("Warm-up failed")
+        finally:
+            self.warming = False
+            self.ready = True
+            logger.info("Startup report: %s", self.report())
+
+    async def shutdown(self):
+        snapshots.stop()
+        embedding_service.stop()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warming": self.warming,
+            "error": self.error,
+            "pid": os.getpid(),
+            "memory": process_memory(),
+            "snapshots": snapshots.describe(),
+            "embeddings": embedding_service.stats(),
+            "timings": dict(self.timings),
+        }
+
+
+# Singleton instance
+lifecycle = Lifecycle()
+
+
+if __name__ == "__main__":
+    # Prints the import and warm-up timings as JSON, e.g. to track startup regressions in CI
+    started = time.perf_counter()
+    lifecycle.import_singletons()
+    lifecycle.warm_up()
+    lifecycle.record("startup.total", time.perf_counter() - started)
+    print(json.dumps(lifecycle.timings, indent=2))
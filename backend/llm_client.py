@@ -0,0 +1,271 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .metrics import registry, GaugeCollector
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """
+    Raised when the upstream LLM cannot serve a request (not configured,
+    circuit open, or retries exhausted). Callers fall back to local logic.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single probe through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def record_abandoned(self):
+        """
+        A call ended without an upstream verdict (e.g. it was cancelled); a pending probe counts as failed.
+        """
+        if self._probing:
+            self.record_failure()
+
+
+class LLMClient:
+    """
+    Shared async client for the OpenAI-compatible API used by the engine and the UI.
+
+    One pooled HTTP client per event loop, a global and a per-model concurrency
+    limit, timeouts, jittered exponential backoff on 429/5xx, and a circuit breaker.
+    Point OPENAI_BASE_URL at a local stub server (or pass a transport) for testing.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        max_concurrency_per_model: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY")
+        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")).rstrip("/")
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "30"))
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+        self.max_concurrency_per_model = max_concurrency_per_model or int(os.getenv("LLM_MAX_CONCURRENCY_PER_MODEL", "16"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30"))
+        )
+        self._transport = transport
+        self._loop = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+        self._model_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # Metrics
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.counters = {"requests": 0, "errors": 0, "retries": 0, "rejected": 0}
+        self.latencies: deque = deque(maxlen=1024)
+
+    @property
+    def is_configured(self) -> bool:
+        return bool(self.api_key) or self._transport is not None
+
+    def _bind_loop(self):
+        # Pools and semaphores belong to an event loop; rebuild them when the loop changes
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                transport=self._transport,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else None,
+            )
+            self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._model_semaphores = {}
+        return self._client
+
+    def _model_semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._model_semaphores:
+            self._model_semaphores[model] = asyncio.Semaphore(self.max_concurrency_per_model)
+        return self._model_semaphores[model]
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_cap))
+            except ValueError:
+                pass
+        return delay
+
+    async def request(self, model: str, path: str, **kwargs) -> httpx.Response:
+        """
+        POSTs to the upstream API with concurrency limits, retries and the circuit breaker.
+        """
+        if not self.is_configured:
+            raise LLMUnavailable("LLM client is not configured (missing OPENAI_API_KEY).")
+        if not self.breaker.allow():
+            self.counters["rejected"] += 1
+            raise LLMUnavailable("LLM circuit breaker is open.")
+
+        # Every exit settles the breaker, so a half-open probe can never stay pending
+        settled = False
+        try:
+            client = self._bind_loop()
+            self.queue_depth += 1
+            try:
+                await self._global_semaphore.acquire()
+                try:
+                    await self._model_semaphore(model).acquire()
+                except BaseException:
+                    self._global_semaphore.release()
+                    raise
+            finally:
+                self.queue_depth -= 1
+
+            self.in_flight += 1
+            try:
+                last_error: Optional[str] = None
+                for attempt in range(self.max_retries + 1):
+                    response = None
+                    started = time.perf_counter()
+                    self.counters["requests"] += 1
+                    try:
+                        response = await client.post(path, **kwargs)
+                    except httpx.HTTPError as exc:
+                        last_error = f"{type(exc).__name__}: {exc}"
+                    else:
+                        self.latencies.append(time.perf_counter() - started)
+                        if response.status_code not in RETRYABLE_STATUS:
+                            # Non-retryable client errors do not indicate an unhealthy upstream
+                            self.breaker.record_success()
+                            settled = True
+                            if response.is_success:
+                                return response
+                            self.counters["errors"] += 1
+                            raise LLMUnavailable(f"Upstream returned HTTP {response.status_code}.")
+                        last_error = f"HTTP {response.status_code}"
+
+                    self.counters["errors"] += 1
+                    if attempt < self.max_retries:
+                        self.counters["retries"] += 1
+                        await asyncio.sleep(self._backoff(attempt, response))
+
+                self.breaker.record_failure()
+                settled = True
+                raise LLMUnavailable(f"Upstream failed after {self.max_retries + 1} attempts ({last_error}).")
+            finally:
+                self.in_flight -= 1
+                self._model_semaphore(model).release()
+                self._global_semaphore.release()
+        finally:
+            if not settled:
+                # Cancelled while queued or in flight
+                self.breaker.record_abandoned()
+
+    async def chat_completion(self, model: str, messages: List[Dict[str, str]], **params) -> str:
+        """
+        Returns the content of the first chat completion choice.
+        A 200 response without text content raises LLMUnavailable like any other upstream failure.
+        """
+        response = await self.request(model, "/chat/completions", json={"model": model, "messages": messages, **params})
+        try:
+            content = response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError) as exc:
+            raise LLMUnavailable(f"Malformed chat completion response ({type(exc).__name__}: {exc}).") from exc
+        if not isinstance(content, str):
+            raise LLMUnavailable("Chat completion response has no text content.")
+        return content
+
+    async def transcribe(self, audio: bytes, filename: str = "audio.wav", model: str = "whisper-1") -> str:
+        """
+        Transcribes an in-memory audio clip and returns the text.
+        """
+        response = await self.request(
+            model, "/audio/transcriptions",
+            data={"model": model},
+            files={"file": (filename, audio, "application/octet-stream")}
+        )
+        return response.json().get("text", "")
+
+    def metrics(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> float:
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "breaker_state": self.breaker.state,
+            **self.counters,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+
+# Singleton instance
+llm_client = LLMClient()
+
+registry.register(GaugeCollector(
+    "llm_client", "Upstream LLM queue depth, request counters and latency (seconds).", ("stat",),
+    lambda: {(k,): v for k, v in llm_client.metrics().items() if isinstance(v, (int, float))}
+))
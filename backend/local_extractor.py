@@ -0,0 +1,202 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Set, Tuple
+
+from .text_matching import CLAUSE_SPLIT, NEGATIONS, PhraseMatcher, tokenize
+
+DEFAULT_ONTOLOGY_PATH = os.path.join(os.path.dirname(__file__), "data", "symptom_ontology.json")
+
+_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "couple": 2, "a couple of": 2, "couple of": 2,
+}
+_DURATION_RE = re.compile(
+    r"\b(?:for|over|about|around)?\s*(?:the\s+)?(?:past|last)?\s*"
+    r"(?P<count>\d+|a couple of|couple of|a few|few|several|a|an|one|two|three|four|five|six|seven|eight|nine|ten)\s+"
+    r"(?P<unit>minute|hour|day|week|month|year)s?(?:\s+ago)?\b",
+    re.IGNORECASE
+)
+_SINCE_RE = re.compile(
+    r"\bsince\s+(?P<since>yesterday|last night|this morning|this afternoon|this evening|last week|"
+    r"(?:mon|tues|wednes|thurs|fri|satur|sun)day|\d{1,2}(?::\d{2})?\s*(?:am|pm))\b",
+    re.IGNORECASE
+)
+
+
+def _phrase_key(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+def parse_durations(text: str) -> Tuple[List[str], str]:
+    """
+    Finds duration expressions ("for 2 days", "since yesterday") and returns them
+    normalized ("2 days", "since yesterday") along with the text they were cut from.
+    """
+    durations: List[str] = []
+
+    def duration(match: re.Match) -> str:
+        count = match.group("count").lower()
+        unit = match.group("unit").lower()
+        if count in ("a few", "few", "several"):
+            durations.append(f"{count.replace('a ', '')} {unit}s")
+        else:
+            number = int(count) if count.isdigit() else _NUMBERS[count]
+            durations.append(f"{number} {unit}" + ("" if number == 1 else "s"))
+        return " "
+
+    def since(match: re.Match) -> str:
+        durations.append(f"since {' '.join(match.group('since').lower().split())}")
+        return " "
+
+    remainder = _SINCE_RE.sub(since, _DURATION_RE.sub(duration, text))
+    return durations, remainder
+
+
+class Ontology:
+    """
+    Synonym ontology loaded from data/symptom_ontology.json: lay phrasings of
+    symptoms, severity words, and medication/condition aliases, each mapped to
+    the canonical term the rest of the pipeline keys on.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.symptoms: Dict[str, str] = {}
+        for name, phrases in data.get("symptoms", {}).items():
+            for phrase in [name] + phrases:
+                self.symptoms[_phrase_key(phrase)] = name
+        self.severity = {
+            _phrase_key(word): level for level, words in data.get("severity", {}).items() for word in words
+        }
+        self.medications = self._aliases(data.get("medications", {}))
+        self.conditions = self._aliases(data.get("conditions", {}))
+        self.filler: Set[str] = {t for word in data.get("filler", []) for t in tokenize(word)}
+
+    @staticmethod
+    def _aliases(groups: Dict[str, List[str]]) -> Dict[str, str]:
+        return {" ".join(alias.split()).lower(): canonical for canonical, aliases in groups.items() for alias in aliases}
+
+    @classmethod
+    def from_file(cls, path: str = None) -> "Ontology":
+        with open(path or os.getenv("SYMPTOM_ONTOLOGY_PATH", DEFAULT_ONTOLOGY_PATH), encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def canonical_symptom(self, name: str) -> str:
+        """
+        Canonical symptom name for a phrasing the ontology knows, else the name unchanged.
+        """
+        return self.symptoms.get(_phrase_key(name), name)
+
+    def canonical_medication(self, name: str) -> str:
+        normalized = " ".join(name.split()).lower()
+        return self.medications.get(normalized, normalized)
+
+    def canonical_condition(self, name: str) -> str:
+        normalized = " ".join(name.split()).lower()
+        return self.conditions.get(normalized, normalized)
+
+
+class LocalExtraction(NamedTuple):
+    """
+    Full result of one local extraction: the symptoms found, the confidence,
+    the canonical names that were only mentioned negated ("no fever") and how
+    many words were neither a known phrase, filler nor a negation.
+    """
+    symptoms: List[Dict[str, Any]]
+    confidence: float
+    negated: List[str]
+    unrecognized: int
+
+
+class LocalSymptomExtractor:
+    """
+    Deterministic rule-based extractor, tried before the LLM.
+    Maps lay phrasings to canonical symptom names, picks up severity words and
+    durations from the same clause and skips negated symptoms ("no fever").
+    The confidence is the share of input tokens it could account for, so free
+    text it does not understand is handed to the LLM instead.
+    """
+
+    def __init__(self, ontology: Ontology = None):
+        self.ontology = ontology or Ontology.from_file()
+        self.matcher = PhraseMatcher(self.ontology.symptoms)
+        self.severity_matcher = PhraseMatcher(self.ontology.severity)
+
+    def extract(self, text: str) -> List[Dict[str, Any]]:
+        return self.scan(text).symptoms
+
+    def analyze(self, text: str) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Returns (symptoms, confidence) with confidence in [0, 1].
+        """
+        return self.scan(text)[:2]
+
+    def scan(self, text: str) -> LocalExtraction:
+        symptoms: Dict[str, Dict[str, Any]] = {}
+        negated: Dict[str, None] = {}
+        all_durations: List[str] = []
+        total = covered = unrecognized = 0
+        # (symptom names, severity) of each non-empty clause, for severities stated apart
+        clauses: List[Tuple[List[str], str]] = []
+        for clause in CLAUSE_SPLIT.split(text):
+            durations, remainder = parse_durations(clause)
+            all_durations += durations
+            covered_tokens = len(tokenize(clause)) - len(tokenize(remainder))
+            tokens = tokenize(remainder)
+            total += len(tokens) + covered_tokens
+            used = [False] * len(tokens)
+
+            severity = "unknown"
+            names: List[str] = []
+            for start, end, phrase in self.severity_matcher.find_spans(tokens):
+                severity = self.ontology.severity[phrase] if severity == "unknown" else severity
+                used[start:end] = [True] * (end - start)
+
+            for start, end, phrase in self.matcher.find_spans(tokens):
+                used[start:end] = [True] * (end - start)
+                name = self.ontology.symptoms[phrase]
+                if any(t in NEGATIONS for t in tokens[:start]):
+                    negated[name] = None
+                    continue
+                names.append(name)
+                if name not in symptoms:
+                    symptoms[name] = {"name": name, "severity": severity, "duration": durations[0] if durations else None}
+            if tokens:
+                clauses.append((names, severity))
+
+            covered += covered_tokens + sum(
+                1 for token, hit in zip(tokens, used) if hit or token in self.ontology.filler
+            )
+            unrecognized += sum(
+                1 for token, hit in zip(tokens, used)
+                if not hit and token not in self.ontology.filler and token not in NEGATIONS
+            )
+
+        # A severity in a clause of its own ("stomach ache, severe") belongs to the
+        # symptoms of the clause before it, else the one after; if neither has any,
+        # it counts as unrecognized so the LLM reads the text instead
+        for i, (names, severity) in enumerate(clauses):
+            if names or severity == "unknown":
+                continue
+            neighbour = next((clauses[j][0] for j in (i - 1, i + 1) if 0 <= j < len(clauses) and clauses[j][0]), [])
+            targets = [symptoms[n] for n in neighbour if n in symptoms and symptoms[n]["severity"] == "unknown"]
+            for symptom in targets:
+                symptom["severity"] = severity
+            if not targets:
+                unrecognized += 1
+
+        # A single duration in the text applies to every symptom ("fever and chills for 2 days")
+        if len(set(all_durations)) == 1:
+            for symptom in symptoms.values():
+                symptom["duration"] = symptom["duration"] or all_durations[0]
+
+        confidence = covered / total if symptoms and total else 0.0
+        return LocalExtraction(
+            list(symptoms.values()), round(confidence, 3), [name for name in negated if name not in symptoms],
+            unrecognized
+        )
+
+
+# Singleton instances
+ontology = Ontology.from_file()
+local_extractor = LocalSymptomExtractor(ontology)
@@ -1,11 +1,43 @@
-from fastapi import FastAPI, HTTPException
+import time
+_import_started = time.perf_counter()
+
+import json
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from .schemas import SymptomRequest, AnalysisResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from .admission import admission, Overloaded
+from .lifecycle import lifecycle
+from .metrics import registry, tracer, http_latency
+from .schemas import (
+    SymptomRequest, AnalysisResponse, BatchSymptomRequest, BatchAnalysisResponse,
+    SessionResponse, SessionTurnRequest, SessionAnalysisResponse
+)
+from .sessions import session_manager, SessionNotFound
+
+lifecycle.record("import.main", time.perf_counter() - _import_started)
+
+# Batch triage limits (overridable per deployment)
+BATCH_MAX_CASES = int(os.getenv("BATCH_MAX_CASES", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Loads heavy resources after the server starts (see lifecycle.py); /ready reports progress.
+    """
+    await lifecycle.startup()
+    yield
+    await lifecycle.shutdown()
 
 app = FastAPI(
     title="Symptom Intelligence Engine API",
     description="AI-driven clinical decision support system backend.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -23,6 +55,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Records request latency per route and, for sampled requests, writes a span trace.
+    """
+    started = time.perf_counter()
+    status = 500
+    with tracer.trace(f"{request.method} {request.url.path}"):
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            http_latency.observe(
+                time.perf_counter() - started,
+                request.method, getattr(route, "path", "unmatched"), str(status)
+            )
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    """
+    Load shedding: the client should retry after the advertised delay.
+    """
+    return JSONResponse(
+        {"detail": str(exc), "lane": exc.lane},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -32,6 +94,23 @@ async def root():
         "version": "0.1.0"
     }
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 until the optional warm-up has finished.
+    Includes the import and warm-up timing report.
+    """
+    report = lifecycle.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus scrape endpoint: stage latencies, retrieval and cache hit rates,
+    safety alerts by severity and the triage-level distribution.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_symptoms(request: SymptomRequest):
     """
@@ -39,20 +118,118 @@ async def analyze_symptoms(request: SymptomRequest):
     Uses Pydantic schemas for request validation and response formatting.
     """
     from .ai_pipeline import engine
-    
-    # 1. Extract symptoms from text
-    symptoms = await engine.extract_symptoms(request.text)
-    
-    # 2. Run triage and reasoning with safety checks
-    analysis = await engine.generate_diagnosis_and_triage(
-        symptoms, 
-        request.vitals,
-        request.medications,
-        request.existing_conditions
-    )
-    
+
+    # Suspected emergencies are admitted ahead of routine cases under load (see admission.py)
+    async with admission.admit(admission.classify(request.text, request.vitals)):
+        # Vitals scoring, symptom extraction, then triage and reasoning with safety checks
+        analysis = await engine.analyze(
+            request.text,
+            request.vitals,
+            request.medications,
+            request.existing_conditions
+        )
+
     return analysis
 
+@app.post("/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_batch(request: BatchSymptomRequest):
+    """
+    Batch endpoint for intake gateways.
+    Runs every case through the pipeline with a bounded concurrency limit;
+    a failing case is reported in its own slot without affecting the others.
+    """
+    from .ai_pipeline import engine
+
+    if len(request.cases) > BATCH_MAX_CASES:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the limit of {BATCH_MAX_CASES} cases.")
+
+    # Each running case holds an admission slot in its own lane, so batches count
+    # against ADMISSION_CONCURRENCY and an emergency inside a batch keeps its priority
+    outcomes = await engine.analyze_batch(
+        [case.dict() for case in request.cases],
+        # Clients may ask for less parallelism than the server allows, never more
+        concurrency=min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY),
+        admit=lambda case: admission.admit(admission.classify(case["text"], case.get("vitals")))
+    )
+
+    results = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            results.append({"index": index, "error": str(outcome) or type(outcome).__name__})
+        else:
+            results.append({"index": index, "result": outcome})
+    return {"results": results}
+
+@app.post("/sessions", response_model=SessionResponse, status_code=201)
+async def create_session():
+    """
+    Starts a multi-turn analysis session; follow-up turns send only what changed.
+    """
+    session = session_manager.create()
+    return {"session_id": session.id, "expires_in": session_manager.sessions.ttl}
+
+@app.post("/sessions/{session_id}/analyze", response_model=SessionAnalysisResponse)
+async def analyze_session_turn(session_id: str, request: SessionTurnRequest):
+    """
+    Incremental re-analysis: extracts symptoms from the new text only, retrieves
+    protocols for newly added symptoms and checks only the medication and
+    condition pairs that involve new entries, then re-runs the triage merge.
+    """
+    try:
+        async with admission.admit(admission.classify(request.text, request.vitals)):
+            return await session_manager.analyze(
+                session_id,
+                request.text,
+                request.vitals,
+                request.medications,
+                request.existing_conditions
+            )
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+
+@app.post("/analyze/stream")
+async def analyze_symptoms_stream(request: SymptomRequest, format: str = "sse"):
+    """
+    Streaming variant of /analyze. Emits events as stages finish:
+    red_flags, vitals, symptoms, safety_alerts, protocols, then the full AnalysisResponse as result.
+    Use format=sse (Server-Sent Events, default) or format=ndjson.
+    """
+    from .ai_pipeline import engine
+
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'.")
+
+    # The slot is held until the last event is sent
+    release = await admission.enter(admission.classify(request.text, request.vitals))
+
+    async def events():
+        try:
+            async for event, payload in engine.analyze_stream(
+                request.text,
+                request.vitals,
+                request.medications,
+                request.existing_conditions
+            ):
+                if event == "result":
+                    payload = AnalysisResponse(**payload)
+                yield encode(event, jsonable_encoder(payload))
+        except Exception as exc:
+            yield encode("error", {"detail": str(exc) or type(exc).__name__})
+        finally:
+            release()
+
+    def encode(event: str, data) -> str:
+        if format == "ndjson":
+            return json.dumps({"event": event, "data": data}) + "\n"
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        events(), media_type=media_type, headers={"Cache-Control": "no-cache"},
+        # Backstop in case the generator never runs (e.g. an early disconnect)
+        background=BackgroundTask(release)
+    )
+
 
 
 
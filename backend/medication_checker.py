@@ -1,69 +1,110 @@
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Mapping
+
+from .interaction_store import (
+    InteractionStore, source_signature,
+    DEFAULT_INTERACTIONS_PATH, DEFAULT_CONTRAINDICATIONS_PATH, DEFAULT_INDEX_DIR
+)
+from .local_extractor import ontology
+from .metrics import stage_timer
+from .snapshots import snapshots
 
 class MedicationSafetyChecker:
     """
     Checks for common hazardous interactions between medications and symptoms.
-    Focuses on hackathon prototype safety rules.
+    Rules are loaded from CSV tables and served from a hash-indexed InteractionStore,
+    published as the "interactions" snapshot so edits to the CSVs are hot-reloaded.
     """
-    
-    def __init__(self):
-        # Sample interaction database
-        self.interactions = [
-            {
-                "med_a": "Aspirin",
-                "med_b": "Ibuprofen",
-                "risk": "Increased risk of stomach ulcers and bleeding",
-                "severity": "HIGH"
-            },
-            {
-                "med_a": "Warfarin",
-                "med_b": "Aspirin",
-                "risk": "High risk of excessive bleeding",
-                "severity": "CRITICAL"
-            }
-        ]
-        
-        self.condition_contraindications = [
-            {
-                "med": "Ibuprofen",
-                "condition": "Asthma",
-                "risk": "May trigger asthma attacks (NSAID sensitivity)",
-                "severity": "MODERATE"
-            },
-            {
-                "med": "Warfarin",
-                "condition": "Ulcer",
-                "risk": "Risk of internal bleeding",
-                "severity": "CRITICAL"
-            }
-        ]
 
-    async def check_interactions(self, medications: List[str], existing_conditions: List[str] = None) -> List[Dict[str, Any]]:
+    def __init__(self, store: InteractionStore = None):
+        # A fixed store (e.g. in tests) bypasses the snapshot registry
+        self._store = store
+        self.interactions_path = os.getenv("INTERACTIONS_PATH", DEFAULT_INTERACTIONS_PATH)
+        self.contraindications_path = os.getenv("CONTRAINDICATIONS_PATH", DEFAULT_CONTRAINDICATIONS_PATH)
+        self.index_dir = os.getenv("INTERACTION_INDEX_DIR", DEFAULT_INDEX_DIR)
+
+    def source_signature(self):
+        return source_signature(self.interactions_path, self.contraindications_path)
+
+    def build_store(self) -> InteractionStore:
+        return InteractionStore.load_or_build(self.interactions_path, self.contraindications_path, self.index_dir)
+
+    @property
+    def store(self) -> InteractionStore:
+        """
+        The active store; loaded on first use (or by the startup warm-up) rather than at import time.
+        """
+        if self._store is not None:
+            return self._store
+        return snapshots.get("interactions").data
+
+    def warm_up(self):
+        """
+        Loads the interaction index and touches its pages.
+        """
+        store = self.store
+        # Reading each array once faults the memory-mapped pages in
+        for array in (store.keys, store.slots, store.rows, store.strings.blob, store.strings.offsets):
+            array.sum()
+
+    async def check_interactions(
+        self,
+        medications: List[str],
+        existing_conditions: List[str] = None,
+        view: Mapping[str, Any] = None
+    ) -> List[Dict[str, Any]]:
         """
         Checks for interaction risks among a list of medications and conditions.
+        Costs O(m^2 + m*c) hash probes, independent of the size of the rule tables.
+        `view` pins the snapshot generation used (see snapshots.py).
+        """
+        return await self.check_additions([], [], medications, existing_conditions or [], view)
+
+    async def check_additions(
+        self,
+        medications: List[str],
+        existing_conditions: List[str],
+        new_medications: List[str],
+        new_conditions: List[str],
+        view: Mapping[str, Any] = None
+    ) -> List[Dict[str, Any]]:
         """
-        alerts = []
-        meds_normalized = [m.strip().capitalize() for m in medications]
-        conditions_normalized = [c.strip().capitalize() for c in (existing_conditions or [])]
-        
-        # Check drug-drug interactions
-        for i, med_a in enumerate(meds_normalized):
-            for med_b in meds_normalized[i+1:]:
-                for interaction in self.interactions:
-                    if (med_a == interaction["med_a"] and med_b == interaction["med_b"]) or \
-                       (med_a == interaction["med_b"] and med_b == interaction["med_a"]):
-                        alerts.append(interaction)
-        
-        # Check drug-condition contraindications
-        for med in meds_normalized:
-            for contra in self.condition_contraindications:
-                if med == contra["med"]:
-                    # Check if any identified condition matches
-                    for condition in conditions_normalized:
-                        if condition.lower() in contra["condition"].lower():
-                            alerts.append(contra)
-                            
-        return alerts
+        Checks only the pairs that involve a new medication or condition, given
+        lists whose pairs were already checked (e.g. earlier turns of a session).
+        Adding k entries costs O(k*(m + c)) probes instead of a full re-check.
+        """
+        if view is None and self._store is None:
+            view = await snapshots.view_async()
+        with stage_timer("safety_checks"):
+            # One store for the whole check, even if a reload swaps it meanwhile
+            store = view["interactions"].data if view is not None and self._store is None else self.store
+            alerts = []
+            # Brand names and aliases resolve to the generic/canonical names the rules are keyed on
+            known_meds = self.normalize_medications(medications)
+            known_conditions = self.normalize_conditions(existing_conditions)
+            new_meds = [m for m in self.normalize_medications(new_medications) if m not in known_meds]
+            added_conditions = [c for c in self.normalize_conditions(new_conditions) if c not in known_conditions]
+
+            # Check drug-drug interactions
+            for i, med_a in enumerate(new_meds):
+                for med_b in known_meds + new_meds[i+1:]:
+                    alerts.extend(store.drug_interactions(med_a, med_b))
+
+            # Check drug-condition contraindications
+            for med in known_meds + new_meds:
+                for condition in (added_conditions if med in known_meds else known_conditions + added_conditions):
+                    alerts.extend(store.condition_contraindications(med, condition))
+
+            return alerts
+
+    @staticmethod
+    def normalize_medications(medications: List[str]) -> List[str]:
+        return list(dict.fromkeys(ontology.canonical_medication(m) for m in medications if m.strip()))
+
+    @staticmethod
+    def normalize_conditions(conditions: List[str]) -> List[str]:
+        return list(dict.fromkeys(ontology.canonical_condition(c) for c in (conditions or []) if c.strip()))
 
 # Singleton instance
 medication_safety = MedicationSafetyChecker()
+snapshots.register("interactions", medication_safety.source_signature, medication_safety.build_store)
@@ -0,0 +1,248 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        self._series: Dict[LabelValues, List[float]] = {}  # bucket counts..., sum, count
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    bucket = _labels(self.labelnames, labels, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket} {count}")
+                bucket = _labels(self.labelnames, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class GaugeCollector:
+    """
+    Gauges read from a callback at scrape time, e.g. cache statistics owned by another object.
+    The callback returns {label_values_tuple: value}.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...], collect: Callable[[], Dict[LabelValues, float]]):
+        self.name, self.help, self.labelnames, self.collect = name, help, labelnames, collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.collect()
+        except Exception:
+            values = {}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {float(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """
+    Sampled request tracing: for a sampled request, every stage_timer span is
+    collected and the trace is appended to TRACE_FILE as one JSON line.
+    """
+
+    def __init__(self, path: Optional[str] = None, sample_rate: Optional[float] = None):
+        self.path = path or os.getenv("TRACE_FILE", "./traces.jsonl")
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+        self._current: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            yield None
+            return
+        trace = {"trace_id": uuid.uuid4().hex, "name": name, "attributes": attributes, "started_at": time.time(), "spans": []}
+        token = self._current.set(trace)
+        started = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            self._current.reset(token)
+            trace["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self._write(trace)
+
+    def add_span(self, name: str, started: float, duration: float):
+        trace = self._current.get()
+        if trace is not None:
+            trace["spans"].append({
+                "name": name,
+                "offset_ms": round((started - trace["started_at"]) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+            })
+
+    def _write(self, trace: Dict[str, Any]):
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace) + "\n")
+        except OSError:
+            pass
+
+
+registry = Registry()
+tracer = Tracer()
+
+stage_latency = registry.register(Histogram(
+    "triage_stage_duration_seconds", "Latency of each pipeline stage.", ("stage",)
+))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+))
+retrieval_results = registry.register(Counter(
+    "triage_retrieval_results_total", "Protocols returned by knowledge-base retrieval.", ()
+))
+retrieval_requests = registry.register(Counter(
+    "triage_retrieval_requests_total", "Retrievals by outcome (hit = at least one protocol).", ("outcome",)
+))
+safety_alerts = registry.register(Counter(
+    "triage_safety_alerts_total", "Safety alerts raised, by severity.", ("severity",)
+))
+triage_levels = registry.register(Counter(
+    "triage_level_total", "Triage decisions, by level.", ("level",)
+))
+extraction_paths = registry.register(Counter(
+    "triage_extraction_total", "Symptom extractions by path (local fast path, cache of earlier llm answers, llm call, local fallback).", ("path",)
+))
+registry.register(GaugeCollector(
+    "process_memory_bytes", "Resident memory of this worker process, by kind.", ("pid", "kind"),
+    lambda: {(str(os.getpid()), kind.replace("_bytes", "")): value for kind, value in process_memory().items()}
+))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Times a block into the stage latency histogram and, when sampled, the current trace.
+    """
+    wall = time.time()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_latency.observe(elapsed, stage)
+        tracer.add_span(stage, wall, elapsed)
+
+
+async def timed(stage: str, awaitable):
+    """
+    Awaits a coroutine inside stage_timer; handy inside asyncio.gather.
+    """
+    with stage_timer(stage):
+        return await awaitable
+
+
+def record_retrieval(protocols: List[Dict[str, Any]]):
+    retrieval_results.inc(amount=len(protocols))
+    retrieval_requests.inc("hit" if protocols else "miss")
+
+
+def record_triage(result: Dict[str, Any]):
+    triage_levels.inc(result["triage_level"])
+    for alert in result.get("safety_alerts", []):
+        safety_alerts.inc(alert.get("severity", "UNKNOWN"))
+
+
+def process_memory() -> Dict[str, int]:
+    """
+    Resident memory of this worker from /proc/self/statm, split into file-backed
+    pages other processes can share (memory-mapped indexes, libraries) and the rest.
+    """
+    page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+    try:
+        with open("/proc/self/statm") as f:
+            _, resident, shared = (int(v) for v in f.read().split()[:3])
+    except (OSError, ValueError):
+        # Not Linux: peak RSS is the best portable figure (KiB on Linux/BSD, bytes on macOS)
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss_bytes": peak if sys.platform == "darwin" else peak * 1024}
+    return {
+        "rss_bytes": resident * page_size,
+        "shared_bytes": shared * page_size,
+        "private_bytes": (resident - shared) * page_size,
+    }
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]):
+    """
+    Exposes a cache's hits, misses and hit rate (from its stats() dict) as gauges.
+    """
+    registry.register(GaugeCollector(
+        f"{name}_cache", f"{name} cache statistics.", ("stat",),
+        lambda: {(k,): v for k, v in stats().items() if k in ("hits", "misses", "hit_rate", "size", "evictions")}
+    ))
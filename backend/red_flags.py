@@ -0,0 +1,60 @@
+import os
+from typing import Iterable, List
+
+from .text_matching import PhraseMatcher, clause_tokens, is_negated, tokenize
+
+DEFAULT_RED_FLAGS_PATH = os.path.join(os.path.dirname(__file__), "data", "red_flags.txt")
+
+
+def load_phrases(path: str) -> List[str]:
+    """
+    Reads one phrase per line, skipping blank lines and '#' comments.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+class RedFlagDetector:
+    """
+    Detects emergency red-flag phrases in symptom text.
+    The phrase list is compiled once into a token automaton, so each check is a
+    single pass over the input regardless of how many phrases are maintained.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.matcher = PhraseMatcher(phrases)
+
+    @classmethod
+    def from_file(cls, path: str = None) -> "RedFlagDetector":
+        return cls(load_phrases(path or os.getenv("RED_FLAGS_PATH", DEFAULT_RED_FLAGS_PATH)))
+
+    def match(self, symptoms: Iterable[str]) -> List[str]:
+        """
+        Returns the red-flag phrases found across the given symptom strings.
+        Each symptom is scanned separately so phrases never span two symptoms.
+        """
+        found: List[str] = []
+        for symptom in symptoms:
+            found.extend(self.matcher.find_tokens(tokenize(symptom)))
+        return list(dict.fromkeys(found))
+
+    def match_text(self, text: str) -> List[str]:
+        """
+        Returns the red-flag phrases in free patient text, skipping negated ones
+        ("I do not have chest pain") with the same clause-scoped negation the
+        local extractor applies. This is the one raw-text check behind the API,
+        the stream, sessions and admission, so their verdicts cannot disagree.
+        """
+        tokens, clause_starts = clause_tokens(text)
+        found = [
+            phrase for start, _, phrase in self.matcher.find_spans(tokens)
+            if not is_negated(tokens, clause_starts, start)
+        ]
+        return list(dict.fromkeys(found))
+
+    def __len__(self) -> int:
+        return len(self.matcher)
+
+
+# Singleton instance
+red_flag_detector = RedFlagDetector.from_file()
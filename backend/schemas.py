@@ -6,7 +6,7 @@ class SymptomRequest(BaseModel):
     Schema for incoming symptom analysis requests.
     """
     text: str = Field(..., description="Unstructured symptom description from the user.")
-    vitals: Optional[Dict[str, Any]] = Field(None, description="Optional vital signs like temperature, heart rate.")
+    vitals: Optional[Dict[str, Any]] = Field(None, description="Optional vital signs: temp (°C), heart_rate (bpm), bp_sys (mmHg), spo2 (%), respiratory_rate (/min), avpu (A, C, V, P or U), supplemental_oxygen (bool). Omit values that were not measured.")
     medications: List[str] = Field(default=[], description="List of medications the user is currently taking.")
     existing_conditions: List[str] = Field(default=[], description="Existing medical conditions.")
     user_context: Optional[Dict[str, Any]] = Field(None, description="Optional demographic or historical data.")
@@ -32,3 +32,51 @@ class AnalysisResponse(BaseModel):
     disclaimer: str = Field(
         default="This is an AI-generated assessment for decision support and not a clinical diagnosis. Consult a professional."
     )
+    snapshot_version: Optional[str] = Field(None, description="Versions of the protocol and interaction data the assessment was computed from.")
+    vitals_assessment: Optional[Dict[str, Any]] = Field(None, description="NEWS2 early-warning score of the vitals: total, risk band, critical flag and points per parameter.")
+
+class SessionResponse(BaseModel):
+    """
+    Schema for a newly created analysis session.
+    """
+    session_id: str = Field(..., description="Id to pass to /sessions/{session_id}/analyze.")
+    expires_in: float = Field(..., description="Seconds of inactivity after which the session is dropped.")
+
+class SessionTurnRequest(BaseModel):
+    """
+    Schema for one follow-up turn of a session: only what is new since the last turn.
+    """
+    text: str = Field("", description="New symptom text, e.g. a new symptom or a corrected duration.")
+    vitals: Optional[Dict[str, Any]] = Field(None, description="Updated vital signs, in the units of SymptomRequest.vitals; merged into earlier ones.")
+    medications: List[str] = Field(default=[], description="Medications added in this turn.")
+    existing_conditions: List[str] = Field(default=[], description="Conditions added in this turn.")
+
+class SessionAnalysisResponse(AnalysisResponse):
+    """
+    Schema for the analysis after a session turn, covering every turn so far.
+    """
+    session_id: str = Field(..., description="Session the analysis belongs to.")
+    turn: int = Field(..., description="Number of turns applied so far.")
+    added: Dict[str, List[str]] = Field(default={}, description="Symptoms, medications and conditions this turn added.")
+    removed: Dict[str, List[str]] = Field(default={}, description="Symptoms this turn retracted, e.g. \"actually no fever\".")
+
+class BatchSymptomRequest(BaseModel):
+    """
+    Schema for batch triage requests submitted by intake gateways.
+    """
+    cases: List[SymptomRequest] = Field(..., description="Cases to analyze; results are returned in the same order.")
+    concurrency: Optional[int] = Field(None, ge=1, description="Maximum number of cases processed concurrently; capped at the server's BATCH_CONCURRENCY.")
+
+class BatchAnalysisItem(BaseModel):
+    """
+    Schema for the outcome of a single case within a batch.
+    """
+    index: int = Field(..., description="Position of the case in the submitted batch.")
+    result: Optional[AnalysisResponse] = Field(None, description="Analysis result, if the case succeeded.")
+    error: Optional[str] = Field(None, description="Error message, if the case failed.")
+
+class BatchAnalysisResponse(BaseModel):
+    """
+    Schema for batch triage responses.
+    """
+    results: List[BatchAnalysisItem] = Field(..., description="Per-case outcomes in submission order.")
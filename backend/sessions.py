@@ -0,0 +1,196 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from .cache import TTLCache, MISSING
+from .lexical_index import reciprocal_rank_fusion
+from .local_extractor import local_extractor
+from .metrics import stage_timer
+from .snapshots import snapshots
+
+
+class SessionNotFound(KeyError):
+    """
+    Raised for unknown or expired session ids.
+    """
+
+
+class Session:
+    """
+    Everything earlier turns of a conversation already computed: symptoms by
+    name, protocols retrieved per symptom, the medications and conditions whose
+    pairs were checked and the alerts they raised, and the snapshot version all
+    of it was computed against.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.created_at = time.time()
+        self.turns = 0
+        self.symptoms: Dict[str, Dict[str, Any]] = {}
+        self.protocols: Dict[str, List[Dict[str, Any]]] = {}
+        self.medications: List[str] = []
+        self.conditions: List[str] = []
+        self.safety_alerts: List[Dict[str, Any]] = []
+        # Red flags stated in any turn's text; a later retraction does not de-escalate
+        self.red_flags: List[str] = []
+        self.vitals: Dict[str, Any] = {}
+        self.snapshot_version: Optional[str] = None
+        # Turns of one session are applied one at a time
+        self.lock = asyncio.Lock()
+
+
+class SessionManager:
+    """
+    Session-aware incremental analysis for multi-turn conversations.
+
+    A follow-up turn only extracts symptoms from its new text, retrieves
+    protocols for symptoms not seen before (a re-mentioned symptom just updates
+    its severity and duration, a negated one like "actually no fever" removes
+    it), and checks only the medication and condition pairs that involve a new
+    entry. Each turn's raw text is also screened for red flags, which stay
+    with the session. The cheap triage merge then runs over the
+    accumulated state. If the protocol or interaction data was hot-reloaded
+    since the last turn, the cached retrievals and alerts are recomputed.
+
+    Sessions live in this process's memory (bounded, with a TTL), so a
+    multi-worker deployment needs sticky routing on the session id.
+    """
+
+    def __init__(self):
+        self.sessions = TTLCache(
+            max_size=int(os.getenv("SESSION_MAX_COUNT", "10000")),
+            ttl=float(os.getenv("SESSION_TTL", "3600"))
+        )
+
+    def create(self) -> Session:
+        session = Session(uuid.uuid4().hex)
+        self.sessions.set(session.id, session)
+        return session
+
+    def get(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is MISSING:
+            raise SessionNotFound(session_id)
+        # Reading refreshes the TTL of an active conversation
+        self.sessions.set(session_id, session)
+        return session
+
+    async def analyze(
+        self,
+        session_id: str,
+        text: str = "",
+        vitals: Dict[str, Any] = None,
+        medications: List[str] = None,
+        existing_conditions: List[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Applies one turn (new text, added medications and conditions) and
+        returns the updated analysis plus what this turn added.
+        """
+        session = self.get(session_id)
+        async with session.lock:
+            with stage_timer("session_turn"):
+                return await self._apply_turn(session, text, vitals, medications or [], existing_conditions or [])
+
+    async def _apply_turn(
+        self,
+        session: Session,
+        text: str,
+        vitals: Optional[Dict[str, Any]],
+        medications: List[str],
+        existing_conditions: List[str]
+    ) -> Dict[str, Any]:
+        from .ai_pipeline import engine
+        from .knowledge_base import knowledge_base
+        from .medication_checker import medication_safety
+
+        view = await engine.pin_snapshots()
+        version = snapshots.version(view)
+        # The turn works on copies; the session is only updated once every await succeeded,
+        # so a failed retrieval or safety check leaves it as it was before the turn
+        symptoms = {name: dict(symptom) for name, symptom in session.symptoms.items()}
+        red_flags = list(session.red_flags)
+        vitals_state = {**session.vitals, **(vitals or {})}
+        if version != session.snapshot_version:
+            # New protocol or interaction data: earlier results are recomputed below
+            protocols: Dict[str, List[Dict[str, Any]]] = {}
+            new_medications = session.medications + medications
+            new_conditions = session.conditions + existing_conditions
+            known_meds, known_conditions, known_alerts = [], [], []
+        else:
+            protocols = dict(session.protocols)
+            new_medications, new_conditions = medications, existing_conditions
+            known_meds, known_conditions, known_alerts = session.medications, session.conditions, session.safety_alerts
+
+        vitals_score = engine.assess_vitals(vitals_state)
+
+        added_symptoms, removed_symptoms = [], []
+        if text.strip():
+            for flag in engine.match_text_red_flags(text):
+                if flag not in red_flags:
+                    red_flags.append(flag)
+            # "actually no fever" retracts a symptom reported earlier
+            negated = local_extractor.scan(text).negated
+            for name in negated:
+                if symptoms.pop(name, None) is not None:
+                    protocols.pop(name, None)
+                    removed_symptoms.append(name)
+            # Critical vitals decide the turn; the local extractor is enough to report symptoms
+            extracted = local_extractor.extract(text) if vitals_score.critical else await engine.extract_symptoms(text)
+            for symptom in extracted:
+                if symptom["name"] in negated:
+                    continue
+                known = symptoms.get(symptom["name"])
+                if known is None:
+                    symptoms[symptom["name"]] = dict(symptom)
+                    added_symptoms.append(symptom["name"])
+                else:
+                    # A correction ("actually it's been 3 days") updates the known symptom
+                    if symptom.get("severity") not in (None, "unknown"):
+                        known["severity"] = symptom["severity"]
+                    if symptom.get("duration"):
+                        known["duration"] = symptom["duration"]
+
+        # Retrieval for new symptoms waits until the vitals are no longer critical
+        to_retrieve = [] if vitals_score.critical else [name for name in symptoms if name not in protocols]
+        added_meds = [m for m in medication_safety.normalize_medications(new_medications) if m not in known_meds]
+        added_conditions = [
+            c for c in medication_safety.normalize_conditions(new_conditions) if c not in known_conditions
+        ]
+        retrieved, alerts = await asyncio.gather(
+            asyncio.gather(*(engine.retrieve_clinical_guidelines([name], view) for name in to_retrieve)),
+            medication_safety.check_additions(known_meds, known_conditions, added_meds, added_conditions, view)
+        )
+        protocols.update(zip(to_retrieve, retrieved))
+        symptom_red_flags = await engine.match_red_flags(list(symptoms))
+
+        session.symptoms, session.protocols, session.red_flags, session.vitals = symptoms, protocols, red_flags, vitals_state
+        session.medications = known_meds + added_meds
+        session.conditions = known_conditions + added_conditions
+        session.safety_alerts = known_alerts + alerts
+        session.snapshot_version = version
+        session.turns += 1
+
+        ranked_protocols = reciprocal_rank_fusion(
+            [protocols[name] for name in symptoms if name in protocols],
+            top_k=knowledge_base.top_k
+        )
+        red_flags = list(dict.fromkeys(red_flags + symptom_red_flags))
+        result = engine.build_triage(
+            [dict(s) for s in symptoms.values()], red_flags, ranked_protocols, list(session.safety_alerts),
+            snapshot_version=version, vitals_score=vitals_score
+        )
+        result.update({
+            "session_id": session.id,
+            "turn": session.turns,
+            "added": {"symptoms": added_symptoms, "medications": added_meds, "conditions": added_conditions},
+            "removed": {"symptoms": removed_symptoms},
+        })
+        return result
+
+
+# Singleton instance
+session_manager = SessionManager()
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot(NamedTuple):
+    """
+    One immutable generation of a data source and the indexes built from it.
+    """
+    name: str
+    version: str
+    data: Any
+    loaded_at: float
+
+
+class _Source(NamedTuple):
+    signature: Callable[[], Any]
+    build: Callable[[], Any]
+    on_swap: Optional[Callable[[Snapshot], None]]
+
+
+def signature_version(signature: Any) -> str:
+    """
+    Short, stable identifier for a source signature (file stats, collection version...).
+    """
+    return hashlib.sha256(json.dumps(signature, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+class SnapshotRegistry:
+    """
+    Hot-reloadable read-only data (protocol indexes, interaction tables).
+
+    Each source registers a cheap signature function and a build function. A
+    background watcher polls the signatures and, when one changes, builds the
+    new indexes off the request path and swaps them in by replacing the active
+    mapping in one assignment. Readers never lock: a request takes a view (the
+    mapping itself, which is never mutated) and keeps using it to the end, so
+    in-flight requests finish on the version they started with.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, _Source] = {}
+        self._signatures: Dict[str, Any] = {}
+        self._active: Mapping[str, Snapshot] = {}
+        self._build_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.errors = 0
+
+    def register(self, name: str, signature: Callable[[], Any], build: Callable[[], Any], on_swap: Callable[[Snapshot], None] = None):
+        self._sources[name] = _Source(signature, build, on_swap)
+
+    def _load(self, name: str, only_if_changed: bool = False) -> Optional[Snapshot]:
+        source = self._sources[name]
+        with self._build_lock:
+            current = self._active.get(name)
+            if current is not None and not only_if_changed:
+                # Built by another thread while this one waited
+                return current
+            signature = source.signature()
+            if current is not None and signature == self._signatures.get(name):
+                return None
+            snapshot = Snapshot(name, signature_version(signature), source.build(), time.time())
+            self._signatures[name] = signature
+            # Copy-and-replace: views already handed out keep the previous mapping
+            self._active = {**self._active, name: snapshot}
+        if source.on_swap is not None:
+            source.on_swap(snapshot)
+        return snapshot
+
+    def get(self, name: str) -> Snapshot:
+        """
+        The active snapshot of a source, built on first use.
+        """
+        snapshot = self._active.get(name)
+        return snapshot if snapshot is not None else self._load(name)
+
+    def reload(self, name: str) -> Optional[Snapshot]:
+        """
+        Rebuilds one source now if its signature changed; returns the new snapshot, if any.
+        """
+        return self._load(name, only_if_changed=True) if name in self._active else None
+
+    def view(self) -> Mapping[str, Snapshot]:
+        """
+        Pins the current generation of every source for the duration of a request.
+        """
+        for name in self._sources:
+            if name not in self._active:
+                self._load(name)
+        return self._active
+
+    async def view_async(self, executor: Optional[Executor] = None) -> Mapping[str, Snapshot]:
+        """
+        view() for coroutines: while any source is still unbuilt, the build (and any
+        wait on a build already running in another thread) happens in `executor`
+        instead of blocking the event loop.
+        """
+        if all(name in self._active for name in self._sources):
+            return self._active
+        return await asyncio.get_running_loop().run_in_executor(executor, self.view)
+
+    @staticmethod
+    def version(view: Mapping[str, Snapshot]) -> str:
+        """
+        Audit string naming the snapshot generations a response was computed from.
+        """
+        return ",".join(f"{name}={snapshot.version}" for name, snapshot in sorted(view.items()))
+
+    def refresh(self) -> List[str]:
+        """
+        Rebuilds and swaps every loaded source whose signature changed; returns their names.
+        A failed rebuild keeps serving the previous snapshot.
+        """
+        reloaded = []
+        for name in list(self._active):
+            try:
+                if self._load(name, only_if_changed=True) is not None:
+                    reloaded.append(name)
+            except Exception:
+                self.errors += 1
+                logger.exception("Reloading snapshot '%s' failed; keeping the previous version", name)
+        self.reloads += len(reloaded)
+        if reloaded:
+            logger.info("Reloaded snapshots: %s", self.version({n: self._active[n] for n in reloaded}))
+        return reloaded
+
+    def start(self, interval: Optional[float] = None):
+        """
+        Starts the background watcher thread (once per process, after any fork).
+        """
+        if interval is None:
+            interval = float(os.getenv("SNAPSHOT_RELOAD_INTERVAL", os.getenv("PROTOCOL_VERSION_CHECK_INTERVAL", "30")))
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.refresh()
+
+        self._watcher = threading.Thread(target=watch, name="snapshot-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            name: {"version": s.version, "loaded_at": s.loaded_at}
+            for name, s in sorted(self._active.items())
+        }
+
+
+# Singleton instance
+snapshots = SnapshotRegistry()
@@ -1,6 +1,6 @@
 import pytest
-from ai_pipeline import engine
-from medication_checker import medication_safety
+from backend.ai_pipeline import engine
+from backend.medication_checker import medication_safety
 
 @pytest.mark.asyncio
 async def test_red_flag_detection():
@@ -40,3 +40,564 @@ async def test_condition_contraindication():
     # Test case: Ibuprofen + Asthma
     alerts = await medication_safety.check_interactions(["Ibuprofen"], ["Asthma"])
     assert any("bronchospasm" in a["risk"].lower() for a in alerts)
+
+def test_red_flag_matcher_reports_phrases_on_word_boundaries():
+    from backend.red_flags import RedFlagDetector
+    detector = RedFlagDetector(["chest pain", "shortness of breath", "seizure"])
+    assert detector.match(["Crushing CHEST PAIN", "shortness of breath!"]) == ["chest pain", "shortness of breath"]
+    # Substrings inside other words must not match
+    assert detector.match(["seizures", "chestpain"]) == []
+
+def test_raw_text_red_flags_respect_clause_negation():
+    from backend.admission import AdmissionController, HIGH, NORMAL
+    from backend.red_flags import RedFlagDetector
+    detector = RedFlagDetector(["chest pain", "stiff neck with fever", "no pulse"])
+    assert detector.match_text("I do not have chest pain, just a mild headache") == []
+    # Negation ends at the clause boundary; phrases spanning "with" still match
+    assert detector.match_text("No fever, but chest pain and a stiff neck with fever") == ["chest pain", "stiff neck with fever"]
+    assert detector.match_text("He has no pulse") == ["no pulse"]
+
+    # Admission pre-screens with the same check
+    assert AdmissionController().classify("I do not have chest pain, just a mild headache") == NORMAL
+    assert AdmissionController().classify("crushing chest pain") == HIGH
+
+def test_interaction_store_indexes_unordered_pairs(tmp_path):
+    import numpy as np
+    from backend.interaction_store import InteractionStore
+    store = InteractionStore.build(
+        [{"med_a": f"Drug{i}", "med_b": f"Drug{i + 1}", "risk": "Synthetic risk", "severity": "HIGH"} for i in range(500)],
+        [{"med": "Ibuprofen", "condition": "Asthma", "risk": "NSAID sensitivity", "severity": "MODERATE"}]
+    )
+    store.save(str(tmp_path))
+    loaded = InteractionStore.load(str(tmp_path))
+    assert loaded.drug_interactions("drug8", "drug7") == [
+        {"med_a": "Drug7", "med_b": "Drug8", "risk": "Synthetic risk", "severity": "HIGH"}
+    ]
+    assert loaded.drug_interactions("drug1", "drug3") == []
+    assert loaded.condition_contraindications("ibuprofen", "asthma")[0]["severity"] == "MODERATE"
+    # The string table is memory-mapped like the other arrays
+    assert isinstance(loaded.strings.blob, np.memmap) and loaded.strings[0] == "Drug0"
+
+def test_interaction_store_rejects_hash_collisions(monkeypatch):
+    from backend import interaction_store
+    # Every key collides: hits must still be confirmed against the stored names
+    monkeypatch.setattr(interaction_store, "_key_hash", lambda kind, a, b: 1)
+    store = interaction_store.InteractionStore.build(
+        [{"med_a": "Warfarin", "med_b": "Aspirin", "risk": "Bleeding", "severity": "HIGH"}],
+        [{"med": "Ibuprofen", "condition": "Asthma", "risk": "NSAID sensitivity", "severity": "MODERATE"}]
+    )
+    assert store.drug_interactions("aspirin", "warfarin")[0]["risk"] == "Bleeding"
+    assert store.drug_interactions("aspirin", "ibuprofen") == []
+    assert store.condition_contraindications("ibuprofen", "ulcer") == []
+
+def test_vector_index_returns_top_k_per_query(tmp_path):
+    import numpy as np
+    from backend.vector_index import VectorIndex
+    index = VectorIndex(
+        np.eye(4, dtype=np.float32),
+        ["a", "b", "c", "d"],
+        [{"condition": c} for c in ["A", "B", "C", "D"]]
+    )
+    index.save(str(tmp_path))
+    loaded = VectorIndex.load(str(tmp_path))
+    results = loaded.query([[0.1, 0.9, 0.0, 0.3], [1.0, 0.0, 0.0, 0.0]], n_results=2)
+    assert results[0] == [{"condition": "B"}, {"condition": "D"}]
+    assert results[1][0] == {"condition": "A"}
+
+@pytest.mark.asyncio
+async def test_degraded_retrieval_is_not_cached(monkeypatch):
+    import numpy as np
+    from backend.knowledge_base import knowledge_base
+    from backend.embedding_service import embedding_service
+    await knowledge_base.retrieve(["fever"])
+    knowledge_base.invalidate()
+    monkeypatch.setattr(knowledge_base, "use_embeddings", True)
+
+    async def embedding_outage(texts, cache=True):
+        raise RuntimeError("embedding model unavailable")
+
+    monkeypatch.setattr(embedding_service, "embed_async", embedding_outage)
+    # Keyword search stands in, but the result must not be pinned for the cache TTL
+    assert await knowledge_base.retrieve(["fever"])
+    assert len(knowledge_base.cache) == 0
+
+    async def embeddings(texts, cache=True):
+        return [np.ones(4, dtype=np.float32) for _ in texts]
+
+    monkeypatch.setattr(embedding_service, "embed_async", embeddings)
+    await knowledge_base.retrieve(["fever"])
+    assert len(knowledge_base.cache) == 1
+    knowledge_base.invalidate()
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_misses():
+    import asyncio
+    from backend.cache import SingleFlight, TTLCache
+    calls = []
+
+    async def lookup():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["protocol"]
+
+    flight = SingleFlight()
+    results = await asyncio.gather(*(flight.run(("fever",), lookup) for _ in range(10)))
+    assert results == [["protocol"]] * 10
+    assert len(calls) == 1
+
+    cache = TTLCache(max_size=2)
+    for key in ["a", "b", "c"]:
+        cache.set(key, key)
+    assert cache.get("a", None) is None and cache.get("c") == "c"
+    assert cache.stats()["evictions"] == 1
+
+def test_persistent_cache_survives_reopen_and_expires(tmp_path):
+    import time
+    from backend.cache import PersistentCache, MISSING
+    path = str(tmp_path / "extractions.db")
+    cache = PersistentCache(path, max_entries=10)
+    cache.set("key", [{"name": "Fever", "severity": "mild"}])
+    cache.close()
+
+    reopened = PersistentCache(path, max_entries=10)
+    assert reopened.get("key") == [{"name": "Fever", "severity": "mild"}]
+
+    expired = PersistentCache(path, max_entries=10, max_age=0.001)
+    time.sleep(0.01)
+    assert expired.get("key") is MISSING
+
+@pytest.mark.asyncio
+async def test_persistent_cache_async_access_runs_off_the_event_loop(tmp_path):
+    import threading
+    from backend.cache import PersistentCache, MISSING
+    cache = PersistentCache(str(tmp_path / "extractions.db"))
+    threads = []
+    get = cache.get
+    cache.get = lambda *args: threads.append(threading.current_thread()) or get(*args)
+    await cache.set_async("key", ["Fever"])
+    assert await cache.get_async("key") == ["Fever"]
+    assert await cache.get_async("other") is MISSING
+    assert threads and threading.main_thread() not in threads
+
+@pytest.mark.asyncio
+async def test_llm_client_retries_then_opens_breaker():
+    import httpx
+    from backend.llm_client import LLMClient, CircuitBreaker, LLMUnavailable
+    statuses = [503, 200]
+
+    def handler(request):
+        status = statuses.pop(0) if statuses else 500
+        return httpx.Response(status, json={"choices": [{"message": {"content": "[]"}}]})
+
+    client = LLMClient(
+        api_key="sk-test", base_url="http://stub", max_retries=1, backoff_base=0.001,
+        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60),
+        transport=httpx.MockTransport(handler)
+    )
+    assert await client.chat_completion("stub-model", []) == "[]"
+    assert client.counters["retries"] == 1
+
+    with pytest.raises(LLMUnavailable):
+        await client.chat_completion("stub-model", [])
+    assert client.breaker.state == "open"
+    with pytest.raises(LLMUnavailable):
+        await client.chat_completion("stub-model", [])
+    assert client.counters["rejected"] == 1
+    await client.aclose()
+
+@pytest.mark.asyncio
+async def test_malformed_llm_responses_fall_back_to_local_extraction(monkeypatch):
+    import httpx
+    from backend import ai_pipeline
+    from backend.llm_client import LLMClient, LLMUnavailable
+    bodies = [{"choices": []}, {"choices": [{"message": {"content": None}}]}, {"error": "?"}]
+    client = LLMClient(
+        api_key="sk-test", base_url="http://stub", max_retries=0,
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json=bodies.pop(0)))
+    )
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable):
+            await client.chat_completion("stub-model", [])
+    await client.aclose()
+
+    async def malformed(*args, **kwargs):
+        return '[{"name": "Cough"}, 42]'
+
+    monkeypatch.setattr(ai_pipeline.llm_client, "chat_completion", malformed)
+    text = "coughing up blood since this morning"
+    assert await engine.extract_symptoms(text) == ai_pipeline.local_extractor.extract(text)
+
+@pytest.mark.asyncio
+async def test_extraction_cache_hits_are_not_counted_as_llm_calls(monkeypatch, tmp_path):
+    from backend.cache import PersistentCache
+    from backend.metrics import extraction_paths
+    monkeypatch.setattr(engine, "extraction_cache", PersistentCache(str(tmp_path / "extractions.db")))
+    text = "coughing up blood since this morning"
+    await engine.extraction_cache.set_async(engine.extraction_cache_key(text), [{"name": "Hemoptysis"}])
+    before = dict(extraction_paths._values)
+    assert await engine.extract_symptoms(text) == [{"name": "Hemoptysis"}]
+    assert extraction_paths._values[("cache",)] == before.get(("cache",), 0) + 1
+    assert extraction_paths._values.get(("llm",), 0) == before.get(("llm",), 0)
+
+@pytest.mark.asyncio
+async def test_llm_breaker_probe_is_settled_on_client_error_and_cancellation():
+    import asyncio
+    import httpx
+    from backend.llm_client import LLMClient, CircuitBreaker, LLMUnavailable
+    responses = [400]
+
+    async def handler(request):
+        if not responses:
+            await asyncio.sleep(60)
+        return httpx.Response(responses.pop(0), json={})
+
+    client = LLMClient(
+        api_key="sk-test", base_url="http://stub", max_retries=0,
+        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0),
+        transport=httpx.MockTransport(handler)
+    )
+    # A 4xx probe shows the upstream is reachable: the breaker closes
+    client.breaker.record_failure()
+    with pytest.raises(LLMUnavailable, match="HTTP 400"):
+        await client.chat_completion("stub-model", [])
+    assert client.breaker.state == "closed"
+
+    # A cancelled probe counts as failed, and the next call may probe again
+    client.breaker.record_failure()
+    probe = asyncio.ensure_future(client.chat_completion("stub-model", []))
+    await asyncio.sleep(0.01)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    assert client.breaker.allow()
+    await client.aclose()
+
+def test_metrics_render_prometheus_histogram():
+    from backend.metrics import Registry, Histogram, Counter
+    registry = Registry()
+    latency = registry.register(Histogram("stage_seconds", "Stage latency.", ("stage",), buckets=(0.1, 1.0)))
+    levels = registry.register(Counter("triage_total", "Triage levels.", ("level",)))
+    latency.observe(0.5, "retrieval")
+    levels.inc("URGENT")
+    text = registry.render()
+    assert 'stage_seconds_bucket{stage="retrieval",le="0.1"} 0.0' in text
+    assert 'stage_seconds_bucket{stage="retrieval",le="+Inf"} 1.0' in text
+    assert 'stage_seconds_count{stage="retrieval"} 1.0' in text
+    assert 'triage_total{level="URGENT"} 1.0' in text
+
+@pytest.mark.asyncio
+async def test_transcription_splits_wav_in_memory_and_stitches_chunks():
+    import io, wave
+    from backend.transcription import TranscriptionPipeline, Transcriber, split_wav, stitch
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(b"\x00\x00" * 8000 * 5)
+    audio = buffer.getvalue()
+
+    chunks = split_wav(audio, chunk_seconds=2, overlap_seconds=0.5)
+    assert len(chunks) == 3
+    assert all(wave.open(io.BytesIO(c)).getframerate() == 8000 for c in chunks)
+    assert split_wav(b"not a wav", chunk_seconds=2) == [b"not a wav"]
+
+    assert stitch(["I have a bad", "a bad headache since", "since Monday."]) == "I have a bad headache since Monday."
+
+    class ScriptedTranscriber(Transcriber):
+        async def transcribe(self, audio, filename="audio.wav"):
+            return {"000": "chest pain", "001": "pain and sweating", "002": "since noon"}[filename[:3]]
+
+    pipeline = TranscriptionPipeline(ScriptedTranscriber(), chunk_seconds=2, overlap_seconds=0.5)
+    assert await pipeline.transcribe(audio) == "chest pain and sweating since noon"
+
+def test_lexical_index_ranks_by_bm25_and_fuses_rankings():
+    from backend.lexical_index import LexicalIndex, reciprocal_rank_fusion
+    protocols = [
+        {"id": "p1", "condition": "Fever", "symptoms": ["fever", "chills"], "protocol": "Hydration and rest."},
+        {"id": "p2", "condition": "Chest Pain", "protocol": "Immediate ER triage. Perform ECG."},
+        {"id": "p3", "condition": "Abdominal Pain", "protocol": "Assess for rebound tenderness."},
+        {"id": "p1", "condition": "Fever", "protocol": "Duplicate id is indexed once."},
+    ]
+    index = LexicalIndex(protocols)
+    assert len(index) == 3
+    assert [p["id"] for p, _ in index.search("chest pain")] == ["p2"]
+    assert {p["id"] for p, _ in index.search("abdominal pain fever")} == {"p1", "p3"}
+    # A shared generic word is not a match
+    assert index.search("back pain") == [] and index.search("sore throat joint pain") == []
+    assert [p["id"] for p, _ in index.search("chills", top_k=3)] == ["p1"]
+    assert index.search("sprained ankle") == []
+
+    fused = reciprocal_rank_fusion([[protocols[2], protocols[0]], [protocols[0], protocols[1]]], top_k=2)
+    assert [p["id"] for p in fused] == ["p1", "p3"]
+
+def test_local_extractor_normalizes_synonyms_with_confidence():
+    from backend.local_extractor import local_extractor, ontology
+    symptoms, confidence = local_extractor.analyze("Terrible tummy pain and chills for 2 days")
+    assert symptoms == [
+        {"name": "Abdominal Pain", "severity": "severe", "duration": "2 days"},
+        {"name": "Chills", "severity": "unknown", "duration": "2 days"},
+    ]
+    assert confidence == 1.0
+
+    symptoms, confidence = local_extractor.analyze("no fever but a bad cough since yesterday")
+    assert [s["name"] for s in symptoms] == ["Cough"]
+    assert symptoms[0]["duration"] == "since yesterday"
+
+    # Unfamiliar wording is left to the LLM
+    assert local_extractor.analyze("I have been coughing up blood")[1] < 0.8
+    assert local_extractor.scan("fever, cough and unconscious").unrecognized == 1
+    # A severity stated in its own clause still attaches to the symptom
+    assert local_extractor.scan("stomach ache, severe").symptoms == local_extractor.scan("severe stomach ache").symptoms
+    assert local_extractor.scan("no fever, severe").unrecognized == 1
+    assert ontology.canonical_medication(" Advil ") == "ibuprofen"
+    assert ontology.canonical_symptom("stomach ache") == "Abdominal Pain"
+
+@pytest.mark.asyncio
+async def test_analyze_and_stream_agree_on_raw_text_red_flags():
+    # "unconscious" is a red flag the ontology does not know; it must not be dropped on the fast path
+    for text in ("fever, chills, headache, cough, vomiting, dizzy and unconscious", "fever and a seizure"):
+        analysis = await engine.analyze(text)
+        events = [event async for event in engine.analyze_stream(text)]
+        assert analysis["triage_level"] == events[-1][1]["triage_level"] == "EMERGENCY"
+
+    text = "I do not have chest pain, just a mild headache"
+    analysis = await engine.analyze(text)
+    events = [event async for event in engine.analyze_stream(text)]
+    assert events[0] == ("red_flags", {"emergency": False, "red_flags": []})
+    assert analysis["triage_level"] == events[-1][1]["triage_level"] != "EMERGENCY"
+
+def test_bulk_triage_streams_jsonl_and_csv_cases(tmp_path):
+    from backend.bulk_triage import iter_cases, parse_case
+    jsonl = tmp_path / "cases.jsonl"
+    jsonl.write_text('{"id": "a", "text": "fever", "medications": ["Aspirin"]}\n\n{"text": "cough"}\n')
+    cases = list(iter_cases(str(jsonl)))
+    assert [index for index, _ in cases] == [0, 1]
+    assert parse_case(cases[0][1])["medications"] == ["Aspirin"]
+
+    csv_file = tmp_path / "cases.csv"
+    csv_file.write_text('id,text,medications,vitals\nb,chest pain,Warfarin; Aspirin,"{""heart_rate"": 120}"\n')
+    case = parse_case(next(iter_cases(str(csv_file)))[1])
+    assert case == {
+        "id": "b", "text": "chest pain", "vitals": {"heart_rate": 120},
+        "medications": ["Warfarin", "Aspirin"], "existing_conditions": [],
+    }
+
+def test_triage_rules_scalar_and_vectorized_agree():
+    from backend.triage_rules import triage_rules
+    cases = [
+        ([{"severity": "mild"}], [], []),
+        ([{"severity": "severe"}], [], []),
+        ([{"severity": "moderate"}], ["chest pain"], []),
+        ([], [], [{"severity": "CRITICAL"}]),
+        ([{"severity": "mild"}], [], [{"severity": "MODERATE"}]),
+    ]
+    features = [triage_rules.features(*case) for case in cases]
+    expected = ["ROUTINE", "URGENT", "EMERGENCY", "URGENT", "ROUTINE"]
+    assert [triage_rules.evaluate(f) for f in features] == expected
+    levels = triage_rules.evaluate_batch(triage_rules.encode_batch(features))
+    assert [triage_rules.levels[i] for i in levels] == expected
+    assert triage_rules.matched(features[2]) == ["red_flag", "moderate_symptom"]
+
+def test_snapshot_registry_swaps_on_change_and_keeps_pinned_views():
+    from backend.snapshots import SnapshotRegistry
+    registry = SnapshotRegistry()
+    source = {"version": 1}
+    swaps = []
+    registry.register("table", lambda: dict(source), lambda: {"rows": source["version"]}, swaps.append)
+
+    pinned = registry.view()
+    assert pinned["table"].data == {"rows": 1}
+    assert registry.refresh() == []
+
+    source["version"] = 2
+    assert registry.refresh() == ["table"]
+    assert registry.get("table").data == {"rows": 2}
+    # A request that pinned the old view finishes on the old data
+    assert pinned["table"].data == {"rows": 1}
+    assert registry.version(pinned) != registry.version(registry.view())
+    assert [s.data for s in swaps] == [{"rows": 1}, {"rows": 2}]
+
+@pytest.mark.asyncio
+async def test_snapshot_first_build_runs_off_the_event_loop():
+    import threading
+    from backend.snapshots import SnapshotRegistry
+    registry = SnapshotRegistry()
+    builders = []
+    registry.register("table", lambda: 1, lambda: builders.append(threading.current_thread()) or "rows")
+    view = await registry.view_async()
+    assert view["table"].data == "rows" and threading.main_thread() not in builders
+    # Once built, the view is returned without a thread hop
+    assert await registry.view_async() is view
+
+@pytest.mark.asyncio
+async def test_embedding_service_micro_batches_concurrent_callers():
+    import asyncio
+    from backend.embedding_service import EmbeddingService
+    calls = []
+
+    def model(texts):
+        calls.append(list(texts))
+        if "broken" in texts:
+            return [[1.0, 1.0]]
+        return [[float(len(t)), 1.0] for t in texts]
+
+    service = EmbeddingService(load_model=lambda: model)
+    service.max_batch_size, service.max_wait = 8, 0.05
+    results = await asyncio.gather(*(service.embed_async([s]) for s in ["fever", "cough", "fever", "rash"]))
+    # One model call for the distinct texts of all concurrent callers
+    assert len(calls) == 1 and sorted(calls[0]) == ["cough", "fever", "rash"]
+    assert [r[0][0] for r in results] == [5.0, 5.0, 5.0, 4.0]
+
+    assert service.embed(["fever", "cough"])[1][0] == 5.0
+    assert len(calls) == 1  # served from the LRU
+    service.embed([f"doc {i}" for i in range(20)], cache=False)
+    assert max(len(c) for c in calls) <= 8
+
+    # A short model answer fails the batch's callers but not the batcher
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(service.embed_async(["broken", "nausea"]), 1)
+    assert service.embed(["nausea"])[0][0] == 6.0
+    service.stop()
+
+@pytest.mark.asyncio
+async def test_admission_reserves_capacity_for_red_flag_lane():
+    import asyncio
+    from backend.admission import AdmissionController, Overloaded, HIGH, NORMAL
+    admission = AdmissionController()
+    admission.capacity, admission.reserved = 2, 1
+    admission.lanes[NORMAL].queue_limit = 1
+    assert admission.classify("crushing chest pain since an hour") == HIGH
+    assert admission.classify("mild cough") == NORMAL
+
+    await admission.acquire(NORMAL)
+    queued_normal = asyncio.ensure_future(admission.acquire(NORMAL))
+    await asyncio.sleep(0)
+    # The last slot is reserved: routine work queues, an emergency goes straight in
+    assert not queued_normal.done()
+    await asyncio.wait_for(admission.acquire(HIGH), 0.1)
+
+    with pytest.raises(Overloaded) as shed:
+        await admission.acquire(NORMAL)
+    assert shed.value.retry_after >= 1
+
+    queued_high = asyncio.ensure_future(admission.acquire(HIGH))
+    await asyncio.sleep(0)
+    admission.release(NORMAL)
+    # Freed slots go to the high lane first
+    await asyncio.wait_for(queued_high, 0.1)
+    assert not queued_normal.done()
+    admission.release(HIGH)
+    # Routine work resumes only once it is below its share again
+    assert not queued_normal.done()
+    admission.release(HIGH)
+    await asyncio.wait_for(queued_normal, 0.1)
+    assert admission.stats()[NORMAL]["active"] == 1 and admission.stats()[HIGH]["active"] == 0
+
+@pytest.mark.asyncio
+async def test_batch_cases_are_admitted_in_their_own_lane():
+    from contextlib import asynccontextmanager
+    from backend.admission import AdmissionController, HIGH, NORMAL
+    admission = AdmissionController()
+    admission.capacity, admission.reserved = 2, 1
+    lanes, peak = [], [0]
+
+    @asynccontextmanager
+    async def admit(case):
+        lane = admission.classify(case["text"], case.get("vitals"))
+        lanes.append(lane)
+        async with admission.admit(lane):
+            peak[0] = max(peak[0], admission.active)
+            yield
+
+    cases = [{"text": "fever"}, {"text": "cough"}, {"text": "crushing chest pain"}, {"text": "headache"}]
+    outcomes = await engine.analyze_batch(cases, concurrency=4, admit=admit)
+    assert all(isinstance(o, dict) for o in outcomes)
+    # Each case takes its own slot; routine cases never exceed their share
+    assert sorted(lanes) == [HIGH, NORMAL, NORMAL, NORMAL] and peak[0] <= admission.capacity
+    assert admission.active == 0
+
+@pytest.mark.asyncio
+async def test_incremental_safety_check_only_probes_new_pairs():
+    known = await medication_safety.check_interactions(["Aspirin"], ["Asthma"])
+    added = await medication_safety.check_additions(["Aspirin"], ["Asthma"], ["Warfarin", "Advil", "aspirin"], ["Ulcer"])
+    full = await medication_safety.check_interactions(["Aspirin", "Warfarin", "Advil"], ["Asthma", "Ulcer"])
+    # Only pairs involving a new entry are probed; an already-known medication is not re-added
+    assert sorted(map(str, known + added)) == sorted(map(str, full))
+    assert len(added) == 4
+
+@pytest.mark.asyncio
+async def test_session_turns_accumulate_red_flags_and_retractions():
+    from backend.sessions import SessionManager
+    manager = SessionManager()
+    session_id = manager.create().id
+
+    first = await manager.analyze(session_id, "fever and a bad cough for 2 days", medications=["Aspirin"])
+    assert first["added"]["symptoms"] == ["Fever", "Cough"] and first["triage_level"] != "EMERGENCY"
+
+    # A red flag in the turn's text escalates even when it adds no known symptom
+    second = await manager.analyze(session_id, "now he is unconscious", medications=["aspirin"])
+    assert second["triage_level"] == "EMERGENCY" and "unconscious" in second["reasoning"]
+    assert second["added"]["medications"] == []
+
+    third = await manager.analyze(session_id, "actually no fever")
+    assert third["removed"] == {"symptoms": ["Fever"]}
+    assert [s["name"] for s in third["symptoms"]] == ["Cough"]
+    # Retracting a symptom does not clear a red flag stated earlier
+    assert third["triage_level"] == "EMERGENCY" and third["turn"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_session_turn_leaves_the_session_unchanged(monkeypatch):
+    from backend.sessions import SessionManager
+    manager = SessionManager()
+    session_id = manager.create().id
+    await manager.analyze(session_id, "fever", medications=["Aspirin"])
+
+    async def outage(*args, **kwargs):
+        raise RuntimeError("interaction data unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(medication_safety, "check_additions", outage)
+        with pytest.raises(RuntimeError):
+            await manager.analyze(session_id, "and a bad cough", medications=["Warfarin"])
+    session = manager.get(session_id)
+    assert list(session.symptoms) == ["Fever"] and session.medications == ["aspirin"] and session.turns == 1
+
+    # The retried turn still adds (and checks) what the failed one could not
+    retry = await manager.analyze(session_id, "and a bad cough", medications=["Warfarin"])
+    assert retry["added"] == {"symptoms": ["Cough"], "medications": ["warfarin"], "conditions": []}
+
+def test_news2_vitals_scalar_and_vectorized_agree():
+    from backend.vitals import score_vitals, encode_vitals_batch, score_vitals_batch, vitals_scores_from_batch
+    from backend.triage_rules import triage_rules
+    cases = [
+        {"temp": 37.0, "heart_rate": 75, "bp_sys": 120, "bp_dia": 80},
+        {"temp": 39.5, "heart_rate": 135, "bp_sys": 88, "spo2": 90, "respiratory_rate": 26},
+        {"heart_rate": "115", "avpu": "V"},
+        None,
+    ]
+    scores = [score_vitals(c) for c in cases]
+    assert [s.total for s in scores] == [0, 14, 5, 0]
+    assert scores[1].critical and scores[1].risk == "high"
+    assert scores[2].parameters == {"heart_rate": 2, "consciousness": 3}
+    assert vitals_scores_from_batch(score_vitals_batch(encode_vitals_batch(cases))) == scores
+
+    levels = [triage_rules.evaluate(triage_rules.features([], [], [], s)) for s in scores]
+    assert levels == ["ROUTINE", "EMERGENCY", "URGENT", "ROUTINE"]
+
+def test_implausible_vitals_are_treated_as_unmeasured():
+    from backend.vitals import score_vitals, encode_vitals_batch, score_vitals_batch, vitals_scores_from_batch
+    cases = [
+        # 0 sent for "not measured"
+        {"heart_rate": 0, "spo2": 0, "bp_sys": 0, "respiratory_rate": 0, "temp": 37.0},
+        # Fahrenheit temperature and a numeric GCS instead of ACVPU
+        {"temp": 98.6, "avpu": 15},
+        {"temp": "101.2", "avpu": "15"},
+        {"avpu": "alert", "spo2": 100},
+    ]
+    scores = [score_vitals(c) for c in cases]
+    assert [s.total for s in scores] == [0, 0, 0, 0]
+    assert scores[0].parameters == {"temperature": 0}
+    assert scores[1].parameters == {} and not scores[1].critical
+    assert vitals_scores_from_batch(score_vitals_batch(encode_vitals_batch(cases))) == scores
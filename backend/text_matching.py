@@ -0,0 +1,137 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+NEGATIONS = {"no", "not", "without", "denies", "deny", "never", "dont", "don", "isn", "haven", "hasn"}
+# A negation covers the rest of its clause ("no fever, but a cough")
+CLAUSE_SPLIT = re.compile(r"[.;,]|\band\b|\bwith\b|\bbut\b")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases text and splits it into alphanumeric tokens.
+    Matching on tokens (not characters) keeps phrase hits on word boundaries.
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+
+def clause_tokens(text: str) -> Tuple[List[str], List[int]]:
+    """
+    Tokenizes text as a whole and returns, per token, the index of the first
+    token of its clause. Joining words ("with", "and") stay in the token list so
+    phrases spanning them still match, but they start a new clause.
+    """
+    tokens: List[str] = []
+    clause_starts: List[int] = []
+    position = 0
+    for match in list(CLAUSE_SPLIT.finditer(text)) + [None]:
+        clause = tokenize(text[position:match.start() if match else len(text)])
+        clause_starts.extend([len(tokens)] * len(clause))
+        tokens.extend(clause)
+        if match:
+            separator = tokenize(match.group())
+            tokens.extend(separator)
+            clause_starts.extend([len(tokens)] * len(separator))
+            position = match.end()
+    return tokens, clause_starts
+
+
+def is_negated(tokens: List[str], clause_starts: List[int], start: int) -> bool:
+    """
+    Whether a negation word precedes token `start` within its clause.
+    """
+    return any(t in NEGATIONS for t in tokens[clause_starts[start]:start])
+
+
+class PhraseMatcher:
+    """
+    Token-level Aho-Corasick automaton.
+    Compiled once from a phrase list; a scan visits each input token once,
+    so its cost is independent of how many phrases were compiled.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._lengths: List[int] = []
+
+        seen = set()
+        for phrase in phrases:
+            tokens = tuple(tokenize(phrase))
+            if not tokens or tokens in seen:
+                continue
+            seen.add(tokens)
+            self._add(tokens, len(self.phrases))
+            self.phrases.append(" ".join(tokens))
+            self._lengths.append(len(tokens))
+        self._build_failure_links()
+
+    def _add(self, tokens: Tuple[str, ...], phrase_id: int):
+        state = 0
+        for token in tokens:
+            nxt = self._goto[state].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append(phrase_id)
+
+    def _build_failure_links(self):
+        # Depth-1 states fail back to the root; deeper states are linked breadth-first.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def find_tokens(self, tokens: Iterable[str]) -> List[str]:
+        """
+        Returns the phrases found in a token sequence, in order of first occurrence.
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        found: List[int] = []
+        for token in tokens:
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if output[state]:
+                found.extend(output[state])
+        return [self.phrases[i] for i in dict.fromkeys(found)]
+
+    def find_spans(self, tokens: List[str]) -> List[Tuple[int, int, str]]:
+        """
+        Returns every (start, end, phrase) occurrence in a token sequence, end exclusive.
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        spans: List[Tuple[int, int, str]] = []
+        for i, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for phrase_id in output[state]:
+                spans.append((i + 1 - self._lengths[phrase_id], i + 1, self.phrases[phrase_id]))
+        return spans
+
+    def find(self, text: str) -> List[str]:
+        """
+        Returns the phrases found in a piece of free text.
+        """
+        return self.find_tokens(tokenize(text))
+
+    def __len__(self) -> int:
+        return len(self.phrases)
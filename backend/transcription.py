@@ -0,0 +1,139 @@
+import asyncio
+import io
+import os
+import wave
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from .llm_client import llm_client
+from .metrics import stage_timer, timed
+
+
+class Transcriber(ABC):
+    """
+    Turns one in-memory audio clip into text. Subclass to plug in another backend.
+    """
+
+    @abstractmethod
+    async def transcribe(self, audio: bytes, filename: str = "audio.wav") -> str:
+        """
+        Returns the text spoken in the clip.
+        """
+
+
+class OpenAITranscriber(Transcriber):
+    """
+    Uploads the clip to the transcription endpoint through the shared LLM client.
+    """
+
+    def __init__(self, client=None, model: Optional[str] = None):
+        self.client = client or llm_client
+        self.model = model or os.getenv("TRANSCRIPTION_MODEL", "whisper-1")
+
+    async def transcribe(self, audio: bytes, filename: str = "audio.wav") -> str:
+        return await self.client.transcribe(audio, filename, model=self.model)
+
+
+class LocalTranscriber(Transcriber):
+    """
+    Offline stand-in for tests and demos without an API key. Returns fixed text
+    (or a placeholder naming the clip length) instead of recognizing speech.
+    """
+
+    def __init__(self, text: Optional[str] = None):
+        self.text = text
+
+    async def transcribe(self, audio: bytes, filename: str = "audio.wav") -> str:
+        if self.text is not None:
+            return self.text
+        try:
+            with wave.open(io.BytesIO(audio)) as wav:
+                return f"[{wav.getnframes() / wav.getframerate():.1f}s of audio]"
+        except (wave.Error, EOFError):
+            return f"[{len(audio)} bytes of audio]"
+
+
+def split_wav(audio: bytes, chunk_seconds: float, overlap_seconds: float = 0.0) -> List[bytes]:
+    """
+    Splits a WAV clip into self-contained WAV chunks without touching disk.
+    Consecutive chunks share `overlap_seconds` so words on a boundary are not cut.
+    Audio that is not WAV (or is short enough) comes back as a single chunk.
+    """
+    try:
+        with wave.open(io.BytesIO(audio)) as wav:
+            params = wav.getparams()
+            frames = wav.readframes(params.nframes)
+    except (wave.Error, EOFError):
+        return [audio]
+
+    frame_size = params.sampwidth * params.nchannels
+    chunk_frames = max(1, int(chunk_seconds * params.framerate))
+    step = max(1, chunk_frames - int(overlap_seconds * params.framerate))
+    total = len(frames) // frame_size
+    if total <= chunk_frames:
+        return [audio]
+
+    chunks = []
+    for start in range(0, total, step):
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as out:
+            out.setparams(params)
+            out.writeframes(frames[start * frame_size:(start + chunk_frames) * frame_size])
+        chunks.append(buffer.getvalue())
+        if start + chunk_frames >= total:
+            break
+    return chunks
+
+
+def stitch(texts: List[str], max_overlap_words: int = 8) -> str:
+    """
+    Joins chunk transcripts in order, dropping words repeated across a chunk overlap.
+    """
+    words: List[str] = []
+    for text in texts:
+        incoming = text.split()
+        overlap = 0
+        for n in range(min(max_overlap_words, len(words), len(incoming)), 0, -1):
+            if [w.lower().strip(".,!?") for w in words[-n:]] == [w.lower().strip(".,!?") for w in incoming[:n]]:
+                overlap = n
+                break
+        words.extend(incoming[overlap:])
+    return " ".join(words)
+
+
+class TranscriptionPipeline:
+    """
+    Chunked transcription: long recordings are split in memory, the chunks are
+    transcribed concurrently (bounded) and the text is stitched back together.
+    """
+
+    def __init__(
+        self,
+        transcriber: Optional[Transcriber] = None,
+        chunk_seconds: Optional[float] = None,
+        overlap_seconds: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        if transcriber is None:
+            transcriber = LocalTranscriber() if os.getenv("TRANSCRIBER") == "local" else OpenAITranscriber()
+        self.transcriber = transcriber
+        self.chunk_seconds = chunk_seconds or float(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", "30"))
+        self.overlap_seconds = overlap_seconds if overlap_seconds is not None else float(os.getenv("TRANSCRIPTION_OVERLAP_SECONDS", "1"))
+        self.max_concurrency = max_concurrency or int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4"))
+
+    async def transcribe(self, audio: bytes, filename: str = "recording.wav") -> str:
+        with stage_timer("transcription"):
+            chunks = split_wav(audio, self.chunk_seconds, self.overlap_seconds)
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def one(index: int, chunk: bytes) -> str:
+                async with semaphore:
+                    name = filename if len(chunks) == 1 else f"{index:03d}-{filename}"
+                    return await timed("transcription_chunk", self.transcriber.transcribe(chunk, name))
+
+            texts = await asyncio.gather(*(one(i, c) for i, c in enumerate(chunks)))
+            return stitch(texts)
+
+
+# Singleton instance
+transcription = TranscriptionPipeline()
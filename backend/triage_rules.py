@@ -0,0 +1,122 @@
+import json
+import operator
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_TRIAGE_RULES_PATH = os.path.join(os.path.dirname(__file__), "data", "triage_rules.json")
+
+FEATURES = ("red_flag", "max_severity", "max_alert", "symptom_count", "news2", "news2_max_parameter")
+OPERATORS = {
+    "==": operator.eq, "!=": operator.ne,
+    ">=": operator.ge, ">": operator.gt,
+    "<=": operator.le, "<": operator.lt,
+}
+
+Features = Dict[str, int]
+
+
+class TriageRules:
+    """
+    Declarative triage escalation rules loaded from data/triage_rules.json.
+
+    Cases are reduced to a few integer features (red flag, highest symptom
+    severity, highest safety-alert level, symptom count, NEWS2 vitals score and
+    its highest single-parameter score). Each rule is a
+    conjunction of feature comparisons proposing a level, and the most urgent
+    proposed level wins. The same table evaluates one case or a whole batch
+    of feature arrays with NumPy, a few vector operations per rule.
+    """
+
+    def __init__(self, table: Dict[str, Any]):
+        self.levels: List[str] = list(table["levels"])
+        self.default = self.levels.index(table.get("default", self.levels[0]))
+        self.severity_codes: Dict[str, int] = {k.lower(): v for k, v in table["severity_codes"].items()}
+        self.alert_codes: Dict[str, int] = {k.upper(): v for k, v in table["alert_codes"].items()}
+        self.rules = []
+        for rule in table["rules"]:
+            if rule["level"] not in self.levels:
+                raise ValueError(f"Rule '{rule['name']}' has unknown level '{rule['level']}'.")
+            conditions = []
+            for condition in rule["when"]:
+                feature, op = condition["feature"], condition["op"]
+                if feature not in FEATURES:
+                    raise ValueError(f"Rule '{rule['name']}' uses unknown feature '{feature}'.")
+                if op not in OPERATORS:
+                    raise ValueError(f"Rule '{rule['name']}' uses unknown operator '{op}'.")
+                conditions.append((feature, OPERATORS[op], self._code(feature, condition["value"])))
+            self.rules.append((rule["name"], conditions, self.levels.index(rule["level"])))
+
+    def _code(self, feature: str, value: Any) -> int:
+        if feature == "max_severity" and isinstance(value, str):
+            return self.severity_codes[value.lower()]
+        if feature == "max_alert" and isinstance(value, str):
+            return self.alert_codes[value.upper()]
+        return int(value)
+
+    @classmethod
+    def from_file(cls, path: str = None) -> "TriageRules":
+        with open(path or os.getenv("TRIAGE_RULES_PATH", DEFAULT_TRIAGE_RULES_PATH), encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    # ---------------------------------------------------------------- features
+
+    def features(
+        self,
+        extracted_symptoms: List[Dict[str, Any]],
+        red_flags: List[str],
+        safety_alerts: List[Dict[str, Any]],
+        vitals_score: Optional[Tuple[int, int]] = None
+    ) -> Features:
+        """
+        Encodes one case as the integer features the rules compare.
+        `vitals_score` is (NEWS2 total, highest single-parameter score), see vitals.py.
+        """
+        news2, news2_max_parameter = vitals_score[:2] if vitals_score is not None else (0, 0)
+        return {
+            "red_flag": int(bool(red_flags)),
+            "max_severity": max((self.severity_codes.get((s.get("severity") or "").lower(), 0) for s in extracted_symptoms), default=0),
+            "max_alert": max((self.alert_codes.get((a.get("severity") or "").upper(), 0) for a in safety_alerts), default=0),
+            "symptom_count": len(extracted_symptoms),
+            "news2": news2,
+            "news2_max_parameter": news2_max_parameter,
+        }
+
+    def encode_batch(self, cases: Sequence[Features]) -> Dict[str, np.ndarray]:
+        """
+        Stacks per-case features into one int32 array per feature.
+        """
+        return {f: np.fromiter((c[f] for c in cases), dtype=np.int32, count=len(cases)) for f in FEATURES}
+
+    # -------------------------------------------------------------- evaluation
+
+    def matched(self, features: Features) -> List[str]:
+        """
+        Names of the rules that fire for one case.
+        """
+        return [name for name, conditions, _ in self.rules if all(op(features[f], v) for f, op, v in conditions)]
+
+    def evaluate(self, features: Features) -> str:
+        level = self.default
+        for _, conditions, rule_level in self.rules:
+            if rule_level > level and all(op(features[f], v) for f, op, v in conditions):
+                level = rule_level
+        return self.levels[level]
+
+    def evaluate_batch(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Level index per case for feature arrays of equal length; map through `levels` for names.
+        """
+        size = len(next(iter(features.values())))
+        levels = np.full(size, self.default, dtype=np.int8)
+        for _, conditions, rule_level in self.rules:
+            mask = np.ones(size, dtype=bool)
+            for feature, op, value in conditions:
+                mask &= op(features[feature], value)
+            levels[mask] = np.maximum(levels[mask], rule_level)
+        return levels
+
+
+# Singleton instance
+triage_rules = TriageRules.from_file()
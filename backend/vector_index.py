@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_CHROMA_PATH = "./chroma_db"
+DEFAULT_VECTOR_INDEX_DIR = "./vector_index"
+COLLECTION_NAME = "medical_protocols"
+
+
+class VectorIndex:
+    """
+    In-process nearest-neighbour index over the protocol embeddings.
+
+    Embeddings are L2-normalized float32 rows stored in a .npy file and opened
+    memory-mapped; metadata lives in a JSON side table aligned by row. All query
+    vectors are scored in one matrix product and the top-k per query is taken
+    with a partial sort, so a multi-symptom request costs a single vectorized call.
+    """
+
+    def __init__(self, embeddings: np.ndarray, ids: List[str], metadatas: List[Dict[str, Any]], manifest: Optional[Dict[str, Any]] = None):
+        if len(ids) != len(embeddings) or len(metadatas) != len(embeddings):
+            raise ValueError("Embeddings, ids and metadatas must be aligned.")
+        self.embeddings = embeddings
+        self.ids = ids
+        self.metadatas = metadatas
+        self.manifest = manifest or {}
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @classmethod
+    def from_collection(cls, collection) -> "VectorIndex":
+        """
+        Builds the index from a ChromaDB collection, which stays the source of truth.
+        """
+        data = collection.get(include=["embeddings", "metadatas"])
+        embeddings = data.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            raise ValueError(f"Collection '{collection.name}' has no embeddings to index.")
+        return cls(
+            cls._normalize(np.asarray(embeddings)),
+            list(data["ids"]),
+            [dict(m or {}) for m in data["metadatas"]],
+            {"collection": collection.name, "count": len(data["ids"]), "built_at": time.time()}
+        )
+
+    def save(self, index_dir: str):
+        """
+        Writes beside the targets and renames into place, so a rebuild never
+        truncates files a running server has memory-mapped.
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        embeddings_path = os.path.join(index_dir, "embeddings.npy")
+        metadata_path = os.path.join(index_dir, "metadata.json")
+        with open(f"{embeddings_path}.{os.getpid()}.tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        with open(f"{metadata_path}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "metadatas": self.metadatas, "manifest": self.manifest}, f)
+        os.replace(f"{embeddings_path}.{os.getpid()}.tmp", embeddings_path)
+        os.replace(f"{metadata_path}.{os.getpid()}.tmp", metadata_path)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True) -> "VectorIndex":
+        embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r" if mmap else None)
+        with open(os.path.join(index_dir, "metadata.json"), encoding="utf-8") as f:
+            side = json.load(f)
+        return cls(embeddings, side["ids"], side["metadatas"], side.get("manifest"))
+
+    def search(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 2):
+        """
+        Returns (row_indices, scores) arrays of shape (n_queries, k), best match first.
+        """
+        queries = self._normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        scores = queries @ self.embeddings.T
+        k = min(n_results, scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 2) -> List[List[Dict[str, Any]]]:
+        """
+        Chroma-shaped result: one list of metadata dicts per query.
+        """
+        if len(query_embeddings) == 0:
+            return []
+        indices, _ = self.search(query_embeddings, n_results)
+        return [[self.metadatas[i] for i in row] for row in indices.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def build_index(chroma_path: str = DEFAULT_CHROMA_PATH, index_dir: str = DEFAULT_VECTOR_INDEX_DIR) -> VectorIndex:
+    """
+    Rebuilds the on-disk index from the persistent ChromaDB collection.
+    """
+    import chromadb
+    client = chromadb.PersistentClient(path=chroma_path)
+    index = VectorIndex.from_collection(client.get_collection(COLLECTION_NAME))
+    index.save(index_dir)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the in-process protocol vector index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Rebuild the index from the ChromaDB collection")
+    build.add_argument("--chroma-path", default=os.getenv("CHROMA_PATH", DEFAULT_CHROMA_PATH))
+    build.add_argument("--out", default=os.getenv("VECTOR_INDEX_DIR", DEFAULT_VECTOR_INDEX_DIR))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(args.chroma_path, args.out)
+    print(f"Indexed {len(index)} protocols into {args.out} in {time.perf_counter() - start:.2f}s.")
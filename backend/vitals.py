@@ -0,0 +1,187 @@
+import math
+from bisect import bisect_left
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# NEWS2 bands (Royal College of Physicians, 2017; SpO2 scale 1). A value scores
+# POINTS[i] where i is the number of band edges strictly below it, so each edge
+# is the inclusive upper bound of its band.
+NEWS2_BANDS = {
+    "respiratory_rate": ((8, 11, 20, 24), (3, 1, 0, 2, 3)),
+    "spo2": ((91, 93, 95), (3, 2, 1, 0)),
+    "systolic_bp": ((90, 100, 110, 219), (3, 2, 1, 0, 3)),
+    "heart_rate": ((40, 50, 90, 110, 130), (3, 1, 0, 1, 2, 3)),
+    "temperature": ((35.0, 36.0, 38.0, 39.0), (3, 1, 0, 1, 2)),
+}
+PARAMETERS = tuple(NEWS2_BANDS) + ("supplemental_oxygen", "consciousness")
+
+# Values outside these inclusive ranges are treated as not measured: a 0 sent for
+# "not taken", a temperature in Fahrenheit (vitals are in °C) or a typo must not
+# score as a physiological emergency.
+PLAUSIBLE_RANGES = {
+    "respiratory_rate": (1, 80),
+    "spo2": (50, 100),
+    "systolic_bp": (40, 300),
+    "heart_rate": (20, 300),
+    "temperature": (25.0, 45.0),
+}
+# ACVPU levels by first letter; anything else (e.g. a numeric GCS) is unmeasured
+ACVPU = {"A": 0.0, "C": 1.0, "V": 1.0, "P": 1.0, "U": 1.0}
+
+# Spellings accepted in SymptomRequest.vitals (the Streamlit form sends temp, heart_rate, bp_sys, bp_dia)
+ALIASES = {
+    "respiratory_rate": ("respiratory_rate", "resp_rate", "rr"),
+    "spo2": ("spo2", "sp_o2", "oxygen_saturation", "o2_sat"),
+    "systolic_bp": ("bp_sys", "systolic_bp", "sbp", "systolic"),
+    "heart_rate": ("heart_rate", "hr", "pulse"),
+    "temperature": ("temp", "temperature"),
+    "supplemental_oxygen": ("supplemental_oxygen", "on_oxygen", "oxygen"),
+    "consciousness": ("consciousness", "avpu", "acvpu"),
+}
+
+# Aggregate NEWS2 of 7+ calls for an emergency response; 5-6 for an urgent review
+CRITICAL_SCORE = 7
+MEDIUM_SCORE = 5
+
+
+class VitalsScore(NamedTuple):
+    """
+    NEWS2 early-warning score of one set of vital signs.
+    """
+    total: int
+    max_parameter: int
+    parameters: Dict[str, int]
+
+    @property
+    def risk(self) -> str:
+        if self.total >= CRITICAL_SCORE:
+            return "high"
+        if self.total >= MEDIUM_SCORE:
+            return "medium"
+        if self.max_parameter >= 3:
+            return "low-medium"
+        return "low"
+
+    @property
+    def critical(self) -> bool:
+        """
+        Clear physiological emergency: triage can escalate without waiting on extraction or retrieval.
+        """
+        return self.total >= CRITICAL_SCORE
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "news2": self.total,
+            "risk": self.risk,
+            "critical": self.critical,
+            "parameters": self.parameters,
+        }
+
+
+def _number(parameter: str, value: Any) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    low, high = PLAUSIBLE_RANGES[parameter]
+    return number if low <= number <= high else math.nan
+
+
+def _flag(parameter: str, value: Any) -> float:
+    """
+    Points-relevant flag for the categorical parameters (1 = scores 3 or 2 points), NaN if absent.
+    """
+    if value is None:
+        return math.nan
+    if parameter == "consciousness":
+        # ACVPU: anything but Alert (new confusion, voice, pain, unresponsive) scores 3
+        if isinstance(value, (int, float)):
+            return math.nan
+        return ACVPU.get(str(value).strip().upper()[:1], math.nan)
+    if isinstance(value, str):
+        return float(value.strip().lower() in ("1", "true", "yes", "oxygen", "o2"))
+    return float(bool(value))
+
+
+def normalize_vitals(vitals: Optional[Mapping[str, Any]]) -> Dict[str, float]:
+    """
+    Maps a free-form vitals dict onto the NEWS2 parameters; missing, unreadable
+    or implausible values (see PLAUSIBLE_RANGES) are NaN.
+    """
+    vitals = {str(k).lower(): v for k, v in (vitals or {}).items()}
+    values = {}
+    for parameter, names in ALIASES.items():
+        raw = next((vitals[n] for n in names if vitals.get(n) is not None), None)
+        if parameter == "systolic_bp" and raw is None:
+            # "120/80"
+            bp = vitals.get("bp") or vitals.get("blood_pressure")
+            raw = str(bp).split("/")[0] if bp is not None else None
+        if parameter in NEWS2_BANDS:
+            values[parameter] = _number(parameter, raw)
+        else:
+            values[parameter] = _flag(parameter, raw)
+    return values
+
+
+def score_vitals(vitals: Optional[Mapping[str, Any]]) -> VitalsScore:
+    """
+    NEWS2 of one case; parameters that were not measured score 0.
+    """
+    values = normalize_vitals(vitals)
+    parameters: Dict[str, int] = {}
+    for parameter, (edges, points) in NEWS2_BANDS.items():
+        value = values[parameter]
+        if not math.isnan(value):
+            parameters[parameter] = points[bisect_left(edges, value)]
+    if not math.isnan(values["supplemental_oxygen"]):
+        parameters["supplemental_oxygen"] = 2 if values["supplemental_oxygen"] else 0
+    if not math.isnan(values["consciousness"]):
+        parameters["consciousness"] = 3 if values["consciousness"] else 0
+    return VitalsScore(sum(parameters.values()), max(parameters.values(), default=0), parameters)
+
+
+def encode_vitals_batch(cases: Sequence[Optional[Mapping[str, Any]]]) -> Dict[str, np.ndarray]:
+    """
+    Stacks many vitals dicts into one float64 array per parameter (NaN = not measured).
+    """
+    rows = [normalize_vitals(v) for v in cases]
+    return {p: np.fromiter((r[p] for r in rows), dtype=np.float64, count=len(rows)) for p in PARAMETERS}
+
+
+def score_vitals_batch(values: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """
+    Vectorized NEWS2 over parameter arrays of equal length, same bands as score_vitals().
+    Returns int arrays "total" and "max_parameter", a boolean "critical" and the
+    per-parameter points under "parameters" (-1 where not measured).
+    """
+    size = len(next(iter(values.values())))
+    total = np.zeros(size, dtype=np.int16)
+    max_parameter = np.zeros(size, dtype=np.int16)
+    parameters = {}
+    for parameter in PARAMETERS:
+        column = values[parameter]
+        measured = ~np.isnan(column)
+        if parameter in NEWS2_BANDS:
+            edges, points = NEWS2_BANDS[parameter]
+            # searchsorted(side="left") counts edges strictly below each value, like bisect_left
+            bands = np.searchsorted(np.asarray(edges, dtype=np.float64), np.where(measured, column, 0), side="left")
+            parameter_points = np.asarray(points, dtype=np.int16)[bands]
+        else:
+            parameter_points = np.where(column > 0, 2 if parameter == "supplemental_oxygen" else 3, 0).astype(np.int16)
+        parameter_points[~measured] = 0
+        total += parameter_points
+        np.maximum(max_parameter, parameter_points, out=max_parameter)
+        parameters[parameter] = np.where(measured, parameter_points, -1).astype(np.int16)
+    return {"total": total, "max_parameter": max_parameter, "critical": total >= CRITICAL_SCORE, "parameters": parameters}
+
+
+def vitals_scores_from_batch(batch: Dict[str, Any]) -> List[VitalsScore]:
+    """
+    Per-case VitalsScore objects for a scored batch, equal to score_vitals() of each case.
+    """
+    parameters = {name: column.tolist() for name, column in batch["parameters"].items()}
+    return [
+        VitalsScore(int(t), int(m), {name: column[i] for name, column in parameters.items() if column[i] >= 0})
+        for i, (t, m) in enumerate(zip(batch["total"].tolist(), batch["max_parameter"].tolist()))
+    ]
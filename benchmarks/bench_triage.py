@@ -0,0 +1,231 @@
+"""
+Reproducible performance benchmarks for the triage pipeline and API.
+
+Generates a seeded synthetic case corpus, measures each pipeline stage and the
+HTTP endpoints under concurrent load against a local stub LLM server, and writes
+throughput and latency percentiles as JSON that can be compared across commits:
+
+    python -m benchmarks.bench_triage --cases 500 --output bench.json
+    python -m benchmarks.bench_triage --cases 500 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Awaitable, Callable, Dict, List
+
+SEVERITIES = ["mild", "moderate", "severe", "slight", "terrible", ""]
+DURATIONS = ["for 2 days", "since this morning", "for 3 hours", "for a week", ""]
+PHRASES = [
+    "stomach ache", "tummy pain", "fever", "chills", "headache", "cough", "sore throat",
+    "nausea", "throwing up", "dizzy", "tired", "rash", "chest pain", "shortness of breath",
+    "loose stools", "back pain", "runny nose",
+]
+MEDICATIONS = ["Aspirin", "Ibuprofen", "Warfarin", "Paracetamol", "Metformin", "Lisinopril", "Atorvastatin", "Omeprazole"]
+CONDITIONS = ["Asthma", "Ulcer", "Diabetes", "Hypertension", "Migraine"]
+
+
+def generate_corpus(size: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Seeded synthetic cases: symptom text, medication list and existing conditions.
+    """
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(size):
+        parts = []
+        for phrase in rng.sample(PHRASES, rng.randint(1, 4)):
+            parts.append(" ".join(p for p in (rng.choice(SEVERITIES), phrase, rng.choice(DURATIONS)) if p))
+        cases.append({
+            "text": "I have " + " and ".join(parts),
+            "medications": rng.sample(MEDICATIONS, rng.randint(0, 4)),
+            "existing_conditions": rng.sample(CONDITIONS, rng.randint(0, 2)),
+        })
+    return cases
+
+
+def summarize(latencies: List[float], wall_seconds: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+
+    def pct(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+
+    return {
+        "count": len(ordered),
+        "throughput_per_s": round(len(ordered) / wall_seconds, 2) if wall_seconds else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(pct(0.50), 4),
+        "p90_ms": round(pct(0.90), 4),
+        "p99_ms": round(pct(0.99), 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+    }
+
+
+async def measure(items: List[Any], call: Callable[[Any], Awaitable[Any]], concurrency: int = 1) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(item):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(item)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in items))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible /chat/completions stub with a fixed artificial latency.
+    """
+    latency = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        text = body.get("messages", [{}])[-1].get("content", "")
+        symptoms = [{"name": p.title(), "severity": "moderate", "duration": None} for p in PHRASES if p in text][:4]
+        payload = json.dumps({"choices": [{"message": {"content": json.dumps(symptoms)}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_llm(latency_ms: float) -> ThreadingHTTPServer:
+    StubLLMHandler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_benchmarks(args) -> Dict[str, Any]:
+    from backend.ai_pipeline import engine
+    from backend.knowledge_base import knowledge_base
+    from backend.medication_checker import medication_safety
+
+    corpus = generate_corpus(args.cases, args.seed)
+    results: Dict[str, Any] = {}
+
+    extracted = [await engine.extract_symptoms(c["text"]) for c in corpus]
+    names = [[s["name"] for s in symptoms] for symptoms in extracted]
+
+    knowledge_base.connect()
+    results["extract_symptoms"] = await measure(
+        [c["text"] + f" #{i}" for i, c in enumerate(corpus)], engine.extract_symptoms, args.concurrency
+    )
+    results["detect_red_flags"] = await measure(names, engine.detect_red_flags)
+    knowledge_base.cache.clear()
+    results["retrieve_cold"] = await measure(names, knowledge_base.retrieve)
+    results["retrieve_warm"] = await measure(names, knowledge_base.retrieve)
+    results["check_interactions"] = await measure(
+        corpus, lambda c: medication_safety.check_interactions(c["medications"], c["existing_conditions"])
+    )
+    results["generate_diagnosis_and_triage"] = await measure(
+        list(zip(extracted, corpus)),
+        lambda pair: engine.generate_diagnosis_and_triage(pair[0], None, pair[1]["medications"], pair[1]["existing_conditions"]),
+        args.concurrency
+    )
+
+    if not args.skip_http:
+        import httpx
+        from backend.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def post(path: str, body: Dict[str, Any]):
+                response = await client.post(path, json=body)
+                response.raise_for_status()
+
+            # Fresh texts so every request goes through the stub LLM rather than the extraction cache
+            http_corpus = [{**c, "text": c["text"] + f" #http{i}"} for i, c in enumerate(corpus)]
+            results["http_analyze"] = await measure(http_corpus, lambda c: post("/analyze", c), args.concurrency)
+            batch_corpus = [{**c, "text": c["text"] + f" #batch{i}"} for i, c in enumerate(corpus)]
+            batches = [batch_corpus[i:i + args.batch_size] for i in range(0, len(batch_corpus), args.batch_size)]
+            results["http_analyze_batch"] = await measure(batches, lambda b: post("/analyze/batch", {"cases": b}), 1)
+            results["http_analyze_batch"]["cases_per_s"] = round(
+                results["http_analyze_batch"]["throughput_per_s"] * args.batch_size, 2
+            )
+
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"{'stage':32} {'p50 ms':>12} {'p99 ms':>12} {'throughput':>14}")
+    for stage, stats in current["results"].items():
+        base = baseline.get("results", {}).get(stage)
+        if not base:
+            continue
+
+        def delta(key):
+            return f"{(stats[key] - base[key]) / base[key] * 100:+.1f}%" if base[key] else "n/a"
+
+        print(f"{stage:32} {delta('p50_ms'):>12} {delta('p99_ms'):>12} {delta('throughput_per_s'):>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the triage pipeline and API.")
+    parser.add_argument("--cases", type=int, default=200, help="Synthetic corpus size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Artificial latency of the stub LLM")
+    parser.add_argument("--skip-http", action="store_true", help="Only benchmark in-process stages")
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    # Isolate the benchmark from real credentials and caches before importing the backend
+    stub = start_stub_llm(args.llm_latency_ms)
+    os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ["EXTRACTION_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-"), "extractions.db")
+    os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "params": vars(args),
+        },
+        "results": asyncio.run(run_benchmarks(args)),
+    }
+    stub.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
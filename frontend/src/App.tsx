@@ -8,6 +8,7 @@ function App() {
     const [analysisData, setAnalysisData] = useState<any>(null);
     const [error, setError] = useState<string | null>(null);
     const [history, setHistory] = useState<any[]>([]);
+    const [earlyEmergency, setEarlyEmergency] = useState<string[] | null>(null);
 
     // Load history from local storage
     React.useEffect(() => {
@@ -20,9 +21,11 @@ function App() {
     const handleAnalyze = async (data: { text: string; medications: string[]; vitals: any }) => {
         setStep('loading');
         setError(null);
+        setEarlyEmergency(null);
 
         try {
-            const response = await fetch(`${API_URL}/analyze`, {
+            // Stream stage-by-stage results so the red-flag verdict shows up immediately
+            const response = await fetch(`${API_URL}/analyze/stream?format=ndjson`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -33,9 +36,28 @@ function App() {
                 }),
             });
 
-            if (!response.ok) throw new Error('Failed to connect to AI Engine');
-
-            const result = await response.json();
+            if (!response.ok || !response.body) throw new Error('Failed to connect to AI Engine');
+
+            let result: any = null;
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop() || '';
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const { event, data: payload } = JSON.parse(line);
+                    if (event === 'red_flags' && payload.emergency) setEarlyEmergency(payload.red_flags);
+                    if (event === 'result') result = payload;
+                    if (event === 'error') throw new Error(payload.detail);
+                }
+            }
+
+            if (!result) throw new Error('Analysis stream ended without a result');
 
             // Update history
             const newEntry = { ...result, date: new Date().toISOString() };
@@ -98,6 +120,15 @@ function App() {
                     </div>
                 )}
 
+                {step === 'loading' && earlyEmergency && (
+                    <div className="bg-red-500 text-white rounded-3xl p-6 shadow-lg animate-in zoom-in-95 duration-300">
+                        <h2 className="text-2xl font-black mb-1">EMERGENCY</h2>
+                        <p className="text-sm font-medium opacity-90">
+                            Red flags detected: {earlyEmergency.join(', ')}. Seek emergency medical attention immediately.
+                        </p>
+                    </div>
+                )}
+
                 {step === 'loading' && (
                     <div className="animate-in fade-in duration-700 text-center py-16">
                         <div className="relative w-24 h-24 mx-auto mb-8">
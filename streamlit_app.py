@@ -1,12 +1,65 @@
 import streamlit as st
 # Triggering clean redeploy to sync dependencies
 import asyncio
+import queue
+import threading
 from backend.ai_pipeline import engine
-from backend.medication_checker import medication_safety
+from backend.cache import TTLCache, MISSING
+from backend.knowledge_base import knowledge_base
+from backend.transcription import transcription
 import json
 import os
 from streamlit_mic_recorder import mic_recorder
 
+
+class EngineRuntime:
+    """
+    Long-lived event loop on a background thread, shared by every session and rerun.
+    Keeps the LLM connection pool and in-flight request coalescing alive between clicks
+    instead of tearing them down with a fresh asyncio.run() each time.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="engine-loop", daemon=True).start()
+        # Recent analyses, memoized per normalized input
+        self.results = TTLCache(max_size=256, ttl=600)
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stream(self, agen):
+        """
+        Iterates an async generator on the engine loop, yielding its items in the calling (script) thread.
+        """
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except Exception as exc:
+                items.put(exc)
+            finally:
+                items.put(done)
+
+        asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        while (item := items.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+@st.cache_resource
+def get_runtime() -> EngineRuntime:
+    # Open heavy resources once per server process, not once per rerun
+    knowledge_base.connect()
+    return EngineRuntime()
+
+
+runtime = get_runtime()
+
 # Page Config
 st.set_page_config(
     page_title="Symptom Intelligence Engine",
@@ -83,29 +136,18 @@ with st.container():
     audio = mic_recorder(
         start_prompt="Start Recording",
         stop_prompt="Stop Recording",
+        format="wav",
         key='recorder'
     )
     
     if audio:
         with st.spinner("Transcribing your voice..."):
             try:
-                from openai import OpenAI
-                client = OpenAI() # Uses OPENAI_API_KEY from environment
-                
-                # Save bytes to temp file for Whisper API
-                import tempfile
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-                    tmp.write(audio['bytes'])
-                    tmp_path = tmp.name
-                
-                with open(tmp_path, "rb") as audio_file:
-                    transcription = client.audio.transcriptions.create(
-                        model="whisper-1", 
-                        file=audio_file
-                    )
+                # In-memory, chunked transcription (uses OPENAI_API_KEY from environment)
+                transcription_text = runtime.run(transcription.transcribe(audio['bytes'], "recording.wav"))
                 
-                if transcription.text:
-                    symptom_text = transcription.text
+                if transcription_text:
+                    symptom_text = transcription_text
                     st.success(f"Transcribed: {symptom_text}")
                     # Update session state so it persists in the text area
                     st.session_state.symptom_input = symptom_text
@@ -117,9 +159,11 @@ with st.container():
     with col1:
         temp = st.number_input("Temperature (°C)", value=37.0, step=0.1)
         hr = st.number_input("Heart Rate (bpm)", value=75, step=1)
+        spo2 = st.number_input("SpO2 (%)", value=98, step=1)
     with col2:
         sys = st.number_input("Systolic BP", value=120, step=1)
         dia = st.number_input("Diastolic BP", value=80, step=1)
+        rr = st.number_input("Respiratory Rate (/min)", value=16, step=1)
 
     medications = st.text_input("Current Medications (comma separated)", placeholder="e.g., Aspirin, Ibuprofen")
     conditions = st.text_input("Existing Conditions (comma separated)", placeholder="e.g., Asthma, Diabetes")
@@ -132,25 +176,50 @@ if st.button("Analyze Now", type="primary", use_container_width=True):
             # Prepare data
             med_list = [m.strip() for m in medications.split(",")] if medications else []
             cond_list = [c.strip() for c in conditions.split(",")] if conditions else []
-            vitals = {"temp": temp, "heart_rate": hr, "bp_sys": sys, "bp_dia": dia}
+            vitals = {"temp": temp, "heart_rate": hr, "bp_sys": sys, "bp_dia": dia, "spo2": spo2, "respiratory_rate": rr}
 
-            # Run Async Logic
-            async def run_analysis():
-                # Extract symptoms (Mock for demo if no API key, but uses real logic)
-                extracted = [{"name": "Reported Symptom", "severity": "moderate"}] 
-                
-                # Fetch Real Analysis
-                analysis = await engine.generate_diagnosis_and_triage(
-                    extracted_symptoms=extracted,
-                    medications=med_list,
-                    existing_conditions=cond_list
+            # One deduplicated analysis per click, memoized per input
+            cache_key = (
+                " ".join(symptom_text.split()).lower(),
+                tuple(sorted(vitals.items())),
+                tuple(m.lower() for m in med_list),
+                tuple(c.lower() for c in cond_list)
+            )
+            emergency_banner = st.empty()
+
+            def show_emergency(red_flags, vitals_assessment=None):
+                reasons = []
+                if red_flags:
+                    reasons.append(f"red flags detected: {', '.join(red_flags)}")
+                if vitals_assessment and vitals_assessment["critical"]:
+                    reasons.append(f"critical vital signs (NEWS2 {vitals_assessment['news2']})")
+                emergency_banner.error(
+                    f"🚨 **EMERGENCY** - {'; '.join(reasons)}. "
+                    "Seek emergency medical attention immediately."
                 )
-                
-                # Check Safety
-                safety = await medication_safety.check_interactions(med_list, cond_list)
-                return analysis, safety
 
-            analysis, safety = asyncio.run(run_analysis())
+            result = runtime.results.get(cache_key)
+            if result is MISSING:
+                # Stream stage results so red flags show immediately
+                result = {"red_flags": [], "vitals": None, "protocols": [], "analysis": None}
+                for event, payload in runtime.stream(engine.analyze_stream(symptom_text, vitals, med_list, cond_list)):
+                    if event == "red_flags":
+                        result["red_flags"] = payload["red_flags"]
+                        if payload["emergency"]:
+                            show_emergency(payload["red_flags"])
+                    elif event == "vitals":
+                        result["vitals"] = payload
+                        if payload["critical"]:
+                            show_emergency(result["red_flags"], payload)
+                    elif event == "protocols":
+                        result["protocols"] = payload
+                    elif event == "result":
+                        result["analysis"] = payload
+                runtime.results.set(cache_key, result)
+            elif result["red_flags"] or (result["vitals"] and result["vitals"]["critical"]):
+                show_emergency(result["red_flags"], result["vitals"])
+
+            analysis = result["analysis"]
 
             # Display Results
             st.divider()
@@ -166,18 +235,17 @@ if st.button("Analyze Now", type="primary", use_container_width=True):
             """, unsafe_allow_html=True)
 
             # Safety Alerts
-            if safety or analysis.get("safety_alerts"):
+            if analysis.get("safety_alerts"):
                 st.error("⚠️ Clinical Safety Alerts")
-                all_alerts = safety + analysis.get("safety_alerts", [])
-                for alert in all_alerts:
-                    with st.expander(f"{alert['severity']} Warning: {alert.get('medication', 'General')}"):
+                for alert in analysis["safety_alerts"]:
+                    subject = f"{alert['med_a']} + {alert['med_b']}" if "med_a" in alert else f"{alert['med']} with {alert['condition']}"
+                    with st.expander(f"{alert['severity']} Warning: {subject}"):
                         st.write(alert['risk'])
-                        st.info(f"Recommendation: {alert['recommendation']}")
 
             # Protocols
-            if analysis.get("protocols"):
+            if result["protocols"]:
                 st.info("📚 Clinical Protocols Applied")
-                for p in analysis["protocols"]:
+                for p in result["protocols"]:
                     st.write(f"**{p['condition']}**: {p['protocol']}")
                     st.caption(f"Source: {p['source']}")
 